@@ -0,0 +1 @@
+../pi/feature_schema.py
\ No newline at end of file
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+
+"""
+NOTE:
+Replays from the Pi's upload spool carry the same Idempotency-Key header as the
+original request. The first successful response per key is remembered (bounded,
+with a TTL) and returned as-is for any replay, so a set or workout is only
+stored once even if the Pi never saw the first acknowledgement.
+A replay arriving while the original is still being processed gets a 409,
+which the Pi retries later.
+"""
+
+IN_PROGRESS = object()
+
+
+class IdempotencyCache:
+    def __init__(self, max_keys: int = 10_000, ttl: float = 7 * 24 * 3600):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expiry, response | IN_PROGRESS)
+        self._lock = threading.Lock()
+        self.replays = 0
+
+    def begin(self, key: str):
+        """
+        Returns None if the key is new (and now marked in progress),
+        otherwise the cached response or IN_PROGRESS
+        """
+        now = time.time()
+        with self._lock:
+            while self._entries:
+                expiry, _ = next(iter(self._entries.values()))
+                if expiry > now and len(self._entries) < self.max_keys:
+                    break
+                self._entries.popitem(last=False)
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.replays += 1
+                return entry[1]
+            self._entries[key] = (now + self.ttl, IN_PROGRESS)
+            return None
+
+    def finish(self, key: str, response) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, response)
+
+    def abort(self, key: str) -> None:
+        # failed: let the next attempt run again
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+cache = IdempotencyCache()
+
+
+def idempotent(view):
+    """
+    Route decorator: dedupe requests carrying an Idempotency-Key header
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+
+        cached = cache.begin(key)
+        if cached is IN_PROGRESS:
+            return jsonify({"error": "Request already in progress"}), 409
+        if cached is not None:
+            body, status = cached
+            return jsonify(body), status
+
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            cache.abort(key)
+            raise
+
+        body, status = response if isinstance(response, tuple) else (response, 200)
+        if 200 <= status < 300:
+            cache.finish(key, (body.get_json(), status))
+        else:
+            cache.abort(key)
+        return response
+    return wrapper
@@ -0,0 +1,249 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from model_registry import registry as default_registry
+
+"""
+NOTE:
+Micro-batched rep-quality inference. Every /api/process request used to call
+model.predict on its own few rows, and for a handful of rows predict is almost
+all fixed cost (DMatrix setup, thread pool, result copy). When many workouts
+end together, rows from concurrent requests for the same exercise are merged
+into one predict call:
+
+    request threads --submit--> per-exercise queue --> worker thread
+                                                        waits up to max_wait after the
+                                                        oldest request, or until
+                                                        max_batch_rows rows are queued,
+                                                        predicts once, splits the result
+    qualities = batcher.predict('Lat Pulldowns', matrix, columns)   # blocks
+
+A lone request waits at most max_wait more than before (default 0: requests
+are only merged when they queue up behind a running predict).
+
+Only models with a fixed cost per call go through the queue (pickled XGBoost
+models, see batches_well). The numpy tree ensembles (tree_ensemble.py, what the
+registry serves) predict in the request thread: nearly no fixed cost, so the
+queue hop and the thread switch cost more than merging saves
+(python inference.py: the load test of both kinds of model).
+Rows are reordered into the model's feature order and passed as float32
+numpy (no DataFrame), which is what XGBoost converts them to anyway.
+Batch sizes and queueing delays of the last batches: batcher.stats()
+(GET /api/inference).
+"""
+
+MAX_BATCH_ROWS = 1024
+# s, 0: only batch what queued up during the previous predict (waiting for more
+# requests lowered the throughput of the XGBoost models too, see the load test)
+MAX_WAIT = 0.0
+STATS_WINDOW = 1000 # batches kept for the stats
+
+
+class _Request:
+    def __init__(self, model, rows: np.ndarray):
+        self.model = model
+        self.rows = rows
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def feature_names(model) -> list[str]:
+    # tree_ensemble.TreeEnsemble, or an XGBoost model (pickled)
+    if hasattr(model, 'get_booster'):
+        return model.get_booster().feature_names
+    return model.feature_names
+
+
+def batches_well(model) -> bool:
+    # XGBoost: DMatrix setup and thread pool on every predict, merged calls pay it once
+    return hasattr(model, 'get_booster')
+
+
+def align_columns(matrix, columns: list[str], names: list[str]) -> np.ndarray:
+    # rows x columns -> rows x names float32, the model's feature order
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if list(columns) == names:
+        return matrix
+    position = {column: i for i, column in enumerate(columns)}
+    missing = [name for name in names if name not in position]
+    if missing:
+        raise ValueError(f'missing feature columns: {missing[:5]}')
+    return matrix[:, [position[name] for name in names]]
+
+
+def percentiles(values) -> dict[str, float]:
+    if not values:
+        return {}
+    p50, p95 = np.percentile(values, [50, 95])
+    return {'p50': float(p50), 'p95': float(p95), 'max': float(max(values))}
+
+
+class MicroBatcher:
+    def __init__(self, registry=default_registry, max_batch_rows: int = MAX_BATCH_ROWS,
+                 max_wait: float = MAX_WAIT):
+        self.registry = registry
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self._queues = {}   # exercise -> queue of _Request, one worker thread each
+        self._names = {}    # exercise -> (model, feature names)
+        self._lock = threading.Lock()
+        # (requests, rows, queue delay ms of the oldest request, predict ms) per batch
+        self._batches = deque(maxlen=STATS_WINDOW)
+        self.total_batches = 0
+        self.total_requests = 0
+        self.total_direct = 0 # requests predicted in their own thread
+
+    def _feature_names(self, exercise: str, model) -> list[str]:
+        cached = self._names.get(exercise)
+        if cached is None or cached[0] is not model:
+            cached = (model, feature_names(model))
+            self._names[exercise] = cached
+        return cached[1]
+
+    def _queue(self, exercise: str) -> queue.SimpleQueue:
+        q = self._queues.get(exercise)
+        if q is None:
+            with self._lock:
+                q = self._queues.get(exercise)
+                if q is None:
+                    q = queue.SimpleQueue()
+                    threading.Thread(target=self._run, args=(q,), daemon=True,
+                                     name=f'inference-{exercise}').start()
+                    self._queues[exercise] = q
+        return q
+
+    def predict(self, exercise: str, matrix, columns: list[str]) -> np.ndarray:
+        """
+        matrix: rows x columns features of one request, returns one prediction per row
+        UnknownExercise for an exercise without a model, ValueError if columns are missing
+        """
+        model = self.registry.get(exercise)
+        rows = align_columns(matrix, columns, self._feature_names(exercise, model))
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.float32)
+        if not batches_well(model):
+            self.total_direct += 1 # approximate under concurrent requests, it's a statistic
+            return model.predict(rows)
+
+        request = _Request(model, rows)
+        self._queue(exercise).put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    ## ---- WORKER ---- ##
+
+    def _run(self, q: queue.SimpleQueue) -> None:
+        carry = None # request that didn't fit in the previous batch
+        while True:
+            first = carry if carry is not None else q.get()
+            carry = None
+            batch = [first]
+            n_rows = len(first.rows)
+            deadline = first.enqueued + self.max_wait
+
+            while n_rows < self.max_batch_rows:
+                timeout = deadline - time.perf_counter()
+                try:
+                    request = q.get(timeout=timeout) if timeout > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                # a model reload splits the batch: every request keeps the model it got
+                if request.model is not first.model or n_rows + len(request.rows) > self.max_batch_rows:
+                    carry = request
+                    break
+                batch.append(request)
+                n_rows += len(request.rows)
+
+            self._predict(batch, n_rows)
+
+    def _predict(self, batch: list[_Request], n_rows: int) -> None:
+        start = time.perf_counter()
+        try:
+            rows = batch[0].rows if len(batch) == 1 else np.concatenate([r.rows for r in batch])
+            predictions = batch[0].model.predict(rows)
+            splits = np.cumsum([len(r.rows) for r in batch[:-1]])
+            for request, result in zip(batch, np.split(predictions, splits)):
+                request.result = result
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        end = time.perf_counter()
+
+        self._batches.append((len(batch), n_rows, (start - batch[0].enqueued) * 1e3, (end - start) * 1e3))
+        self.total_batches += 1
+        self.total_requests += len(batch)
+        for request in batch:
+            request.done.set()
+
+    ## ---- METRICS ---- ##
+
+    def stats(self) -> dict:
+        batches = list(self._batches)
+        return {
+            'max_batch_rows': self.max_batch_rows,
+            'max_wait_ms': self.max_wait * 1e3,
+            'total_batches': self.total_batches,
+            'total_requests': self.total_requests,
+            'total_direct': self.total_direct,
+            'window': len(batches),
+            'requests_per_batch': percentiles([b[0] for b in batches]),
+            'rows_per_batch': percentiles([b[1] for b in batches]),
+            'queue_delay_ms': percentiles([b[2] for b in batches]),
+            'predict_ms': percentiles([b[3] for b in batches]),
+        }
+
+
+batcher = MicroBatcher()
+
+
+## ---- LOAD TEST ---- ##
+
+def load_test(batcher: MicroBatcher, exercise: str, n_requests: int, n_threads: int, reps: int = 12) -> None:
+    # n_threads clients each posting n_requests / n_threads workouts back to back
+    from concurrent.futures import ThreadPoolExecutor
+
+    model = batcher.registry.get(exercise)
+    names = feature_names(model)
+    rng = np.random.default_rng(0)
+    workouts = [rng.standard_normal((reps, len(names))).astype(np.float32) for _ in range(n_requests)]
+    expected = [model.predict(w) for w in workouts]
+
+    def timed(fn):
+        def run(w):
+            start = time.perf_counter()
+            return fn(w), time.perf_counter() - start
+        return run
+
+    for name, fn in [('direct', lambda w: model.predict(w)),
+                     ('batcher', lambda w: batcher.predict(exercise, w, names))]:
+        with ThreadPoolExecutor(n_threads) as pool:
+            start = time.perf_counter()
+            results, latencies = zip(*pool.map(timed(fn), workouts))
+            elapsed = time.perf_counter() - start
+        assert all(np.array_equal(r, e) for r, e in zip(results, expected))
+        print(f'    {name:<8}{n_threads:>4} threads  {n_requests / elapsed:>8.0f} requests/s'
+              f'  latency p50 {np.median(latencies) * 1e3:>6.2f} ms')
+
+
+if __name__ == '__main__':
+    # numpy ensembles (served, predicted in the request thread) and the pickled XGBoost
+    # models (queued): when is merging concurrent requests worth it
+    from model_registry import ModelRegistry
+
+    pickled = ModelRegistry({'Seated Cable Rows': 'seated_cable_rows.pkl'})
+    for registry, max_wait in [(default_registry, 0), (pickled, 0), (pickled, 0.002)]:
+        kind = 'npz' if registry is default_registry else 'pkl'
+        print(f'{kind} models, max_wait {max_wait * 1e3} ms')
+        load_batcher = MicroBatcher(registry, max_wait=max_wait)
+        for threads in (1, 8, 32):
+            load_test(load_batcher, 'Seated Cable Rows', 1000, threads)
+        stats = load_batcher.stats()
+        print('   ', {key: stats[key] for key in ('total_direct', 'requests_per_batch', 'queue_delay_ms')})
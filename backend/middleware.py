@@ -0,0 +1,74 @@
+import io
+import zlib
+
+"""
+NOTE:
+WSGI middleware: transparently inflates request bodies sent with
+Content-Encoding: gzip (large uploads from the Pi), so the Flask routes keep
+reading request.json as usual. Bodies without the header pass through untouched.
+"""
+
+MAX_INFLATED_BYTES = 64 * 1024 * 1024 # guard against decompression bombs
+
+
+class GzipRequestMiddleware:
+    def __init__(self, app, max_size: int = MAX_INFLATED_BYTES):
+        self.app = app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        if environ.get('HTTP_CONTENT_ENCODING', '').strip().lower() != 'gzip':
+            return self.app(environ, start_response)
+
+        length = environ.get('CONTENT_LENGTH')
+        stream = environ['wsgi.input']
+        body = stream.read(int(length)) if length else stream.read()
+
+        try:
+            # wbits=31 : gzip header + trailer
+            inflater = zlib.decompressobj(wbits=31)
+            data = inflater.decompress(body, self.max_size)
+            if inflater.unconsumed_tail:
+                return self._error(start_response, '413 Payload Too Large', b'Decompressed body too large')
+            if not inflater.eof:
+                # cut short, eg. a dropped connection: the gzip trailer (CRC, size) never came
+                return self._error(start_response, '400 Bad Request', b'Truncated gzip body')
+            if inflater.unused_data:
+                return self._error(start_response, '400 Bad Request', b'Trailing data after gzip body')
+        except zlib.error:
+            return self._error(start_response, '400 Bad Request', b'Invalid gzip body')
+
+        environ['wsgi.input'] = io.BytesIO(data)
+        environ['CONTENT_LENGTH'] = str(len(data))
+        del environ['HTTP_CONTENT_ENCODING']
+        return self.app(environ, start_response)
+
+    @staticmethod
+    def _error(start_response, status: str, message: bytes):
+        start_response(status, [('Content-Type', 'text/plain'), ('Content-Length', str(len(message)))])
+        return [message]
+
+
+if __name__ == '__main__':
+    import gzip
+
+    def echo(environ, start_response):
+        body = environ['wsgi.input'].read()
+        start_response('200 OK', [])
+        return [body]
+
+    def call(body: bytes) -> tuple[str, bytes]:
+        statuses = []
+        environ = {'HTTP_CONTENT_ENCODING': 'gzip', 'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+        result = GzipRequestMiddleware(echo, max_size=1024)(environ, lambda status, headers: statuses.append(status))
+        return statuses[0].split()[0], b''.join(result)
+
+    data = b'{"pi_id": "pi", "reps": 3}' * 10
+    body = gzip.compress(data)
+    assert call(body) == ('200', data)
+    assert call(body[:-8])[0] == '400'              # CRC / size trailer cut off
+    assert call(body[:len(body) // 2])[0] == '400'  # cut in half
+    assert call(body + b'junk')[0] == '400'         # trailing bytes
+    assert call(b'not gzip')[0] == '400'
+    assert call(gzip.compress(b'0' * 2048))[0] == '413'
+    print('gzip middleware checks passed')
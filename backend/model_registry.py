@@ -0,0 +1,161 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from tree_ensemble import TreeEnsemble
+
+"""
+NOTE:
+Process-wide cache of the rep-quality models: each model file is unpickled
+once, on the first request for its exercise, instead of on every /api/process.
+
+Before handing a model out, the file is stat'ed (a few us): if its mtime or
+size changed, the file is hashed and, if the content really changed, loaded
+again and swapped in with a single assignment. Requests already predicting keep
+the model object they got, nothing is ever mutated in place. If the new file
+fails to load (eg. still being copied), the old model keeps serving.
+Retraining can therefore just write a new model next to the server, no restart.
+
+Paths are relative to this file, not to the working directory.
+
+    model = registry.get('Lat Pulldowns')   # UnknownExercise (KeyError) if none
+    registry.stats()                        # load time, size, hits per model
+"""
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+# exported by tree_export.py from the pickled XGBoost models (same predictions)
+MODEL_FILES = {
+    'Seated Cable Rows': 'seated_cable_rows.npz',
+    'Lat Pulldowns': 'lat_pulldowns.npz',
+}
+
+
+class UnknownExercise(KeyError):
+    pass
+
+
+def _load_pickle(body: bytes):
+    return pickle.loads(body)
+
+
+# file extension -> loader(file bytes) -> object with .predict(features)
+LOADERS = {
+    '.npz': TreeEnsemble.from_bytes,
+    '.pkl': _load_pickle,
+}
+
+
+class _Entry:
+    def __init__(self, model, signature, sha256: str, size: int, load_seconds: float):
+        self.model = model
+        self.signature = signature # (mtime_ns, size) the model was loaded from
+        self.sha256 = sha256
+        self.size = size
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.hits = 0
+
+
+class ModelRegistry:
+    def __init__(self, files: dict[str, str] = MODEL_FILES, model_dir: str = MODEL_DIR):
+        self.paths = {exercise: os.path.join(model_dir, file) for exercise, file in files.items()}
+        self._entries = {}      # exercise -> _Entry, replaced (never modified) on reload
+        self._failed = {}       # exercise -> signature of a file that failed to load
+        self._lock = threading.Lock()
+        self.loads = {exercise: 0 for exercise in self.paths}
+        self.reloads = {exercise: 0 for exercise in self.paths}
+
+    def __contains__(self, exercise) -> bool:
+        return exercise in self.paths
+
+    @property
+    def exercises(self) -> list[str]:
+        return list(self.paths)
+
+    @staticmethod
+    def _signature(path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, exercise: str):
+        path = self.paths.get(exercise)
+        if path is None:
+            raise UnknownExercise(exercise)
+
+        entry = self._entries.get(exercise)
+        signature = self._signature(path)
+        if entry is None or (signature is not None and signature != entry.signature
+                             and signature != self._failed.get(exercise)):
+            entry = self._load(exercise, path)
+
+        entry.hits += 1 # approximate under concurrent requests, it's a statistic
+        return entry.model
+
+    def _load(self, exercise: str, path: str) -> _Entry:
+        # one loader at a time, everyone else keeps using the current entry meanwhile
+        with self._lock:
+            entry = self._entries.get(exercise)
+            signature = self._signature(path)
+            if entry is not None and signature in (None, entry.signature, self._failed.get(exercise)):
+                return entry # another request got here first, or nothing to load
+
+            start = time.perf_counter()
+            try:
+                with open(path, 'rb') as file:
+                    body = file.read()
+                sha256 = hashlib.sha256(body).hexdigest()
+                if entry is not None and sha256 == entry.sha256:
+                    # touched, not changed
+                    model = entry.model
+                else:
+                    model = LOADERS[os.path.splitext(path)[1]](body)
+            except Exception as e:
+                if entry is None:
+                    raise
+                print(f"Error reloading model {path}, keeping the loaded one: {e}")
+                self._failed[exercise] = signature
+                return entry
+
+            new_entry = _Entry(model, signature, sha256, len(body), time.perf_counter() - start)
+            if entry is None:
+                self.loads[exercise] += 1
+            else:
+                new_entry.hits = entry.hits
+                if model is not entry.model:
+                    self.loads[exercise] += 1
+                    self.reloads[exercise] += 1
+            self._failed.pop(exercise, None)
+            self._entries[exercise] = new_entry # atomic swap
+            return new_entry
+
+    def preload(self) -> None:
+        for exercise in self.paths:
+            self.get(exercise)
+
+    def stats(self) -> dict[str, dict]:
+        stats = {}
+        for exercise, path in self.paths.items():
+            entry = self._entries.get(exercise)
+            stats[exercise] = {
+                'path': os.path.basename(path),
+                'loaded': entry is not None,
+                'loads': self.loads[exercise],
+                'reloads': self.reloads[exercise],
+            }
+            if entry is not None:
+                stats[exercise].update({
+                    'load_ms': round(entry.load_seconds * 1e3, 3),
+                    'size_bytes': entry.size,
+                    'sha256': entry.sha256[:16],
+                    'loaded_at': entry.loaded_at,
+                    'hits': entry.hits,
+                })
+        return stats
+
+
+registry = ModelRegistry()
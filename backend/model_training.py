@@ -7,6 +7,8 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.model_selection import GridSearchCV
 import pickle
+from tree_export import export_model
+from feature_schema import CHANNELS, FEATURE_COLUMNS
 import matplotlib.pyplot as plt
 import ast
 import re
@@ -42,7 +44,7 @@ labels = [93, 78, 87, 78, 84, 85, 78, 89, 67, 89,
 ]
 df['quality_score'] = labels
 
-# Convert list columns to statistical features
+# Convert list columns to statistical features (feature_schema.STATS, same order)
 def extract_features(series):
     return pd.Series({
         'mean': np.mean(series),
@@ -57,10 +59,7 @@ def extract_features(series):
 
 
 # Process sensor columns
-sensor_columns = ['accel_x', 'accel_y', 'accel_z', 
-                 'vel_x', 'vel_y', 'vel_z',
-                 'pos_x', 'pos_y', 'pos_z',
-                 'mag_x', 'mag_y', 'mag_z']
+sensor_columns = CHANNELS
 
 # Create new DataFrame with extracted features
 feature_df = pd.DataFrame()
@@ -72,7 +71,8 @@ feature_df['quality_score'] = df['quality_score']
 
 # Split data
 # Preprocessing
-X = feature_df.drop('quality_score', axis=1)
+# Columns in the exact order the Pi sends them and the server feeds the model (feature_schema.py)
+X = feature_df[FEATURE_COLUMNS]
 y = feature_df['quality_score']
 
 
@@ -105,6 +105,9 @@ param_grid = {
 with open("backend/seated_cable_rows.pkl", "rb") as file:
     best_tree = pickle.load(file)
 
+# What the server loads (numpy only, same predictions): model_registry.py
+export_model(best_tree, "backend/seated_cable_rows.npz")
+
 print(type(X_test))
 print(X_test)
 # Evaluate
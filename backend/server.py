@@ -7,14 +7,21 @@ import boto3
 from login import register_user, verify_user
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from analysis import calculate_lifetime_metrics, calculate_rep_qualities
+from middleware import GzipRequestMiddleware
+from idempotency import idempotent
+from upload_format import decode_features, CONTENT_TYPE as FEATURES_CONTENT_TYPE
+from model_registry import registry, UnknownExercise
+from inference import batcher
+from feature_schema import FEATURE_COLUMNS, check_matrix, check_version, matrix_from_nested
+from state_channel import channel, MAX_WAIT as PI_WAIT_MAX
 import uuid
-import pickle
-import pandas as pd
+import math
 import decimal
 from decimal import Decimal
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend requests
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)  # Inflate gzip uploads from the Pi
 app.config["JWT_SECRET_KEY"] = "supersecretkey"
 jwt = JWTManager(app)
 
@@ -46,6 +53,31 @@ global_reps = {}
 user_pi_id={}
 global_user_workouts={}
 
+# Upper bound on the rep number of a Pi-scored quality (/api/rep_quality)
+MAX_SET_REPS = 200
+
+def pi_state(pi_id):
+    # What the Pi should be doing: the exercise of the current set, "Pseudo Idle" between sets, or "Idle"
+    current_user = user_pi_id.get(pi_id)
+    if current_user is None:
+        return "Idle"  # If pi_id is not found, return "Idle"
+    if global_reps[current_user]['workout'] and global_reps[current_user]['set']:
+        return global_reps[current_user]['exercise']
+    elif global_reps[current_user]['workout'] and global_reps[current_user]['set']==False:
+        return "Pseudo Idle"
+    return "Idle"
+
+def pi_set_id(pi_id):
+    # Id of the Pi's current set, the Pi tags that set's rep qualities with it
+    current_user = user_pi_id.get(pi_id)
+    if current_user is None:
+        return None
+    return global_reps[current_user].get('set_id')
+
+def notify_pi(current_user):
+    # Wake the user's Pi if it is waiting in /api/piwait
+    channel.notify(global_reps[current_user]['pi_id'])
+
 
 ############ MOBILE APP ROUTES ############
 
@@ -171,12 +203,15 @@ def start_workout():
         "pi_id":pi_id,
         "exercise": exercise,
         "reps": 0,
+        "rep_qualities": [],
         "workout": True,
         "set": True,
+        "set_id": str(uuid.uuid4()),
         "workoutID": workout_id
     }
     user_pi_id[pi_id]=current_user
     global_user_workouts[current_user]=workout_id
+    channel.notify(pi_id)
     return jsonify(global_reps[current_user]['reps'])
 
 @app.route("/api/reps", methods=["GET"])
@@ -186,6 +221,13 @@ def get_reps():
     reps=global_reps[current_user]['reps']
     return jsonify(reps)
 
+@app.route("/api/rep_qualities", methods=["GET"])
+@jwt_required()
+def get_rep_qualities():
+    # Quality of every rep of the current set scored so far on the Pi
+    current_user = get_jwt_identity()
+    return jsonify(global_reps[current_user].get('rep_qualities', []))
+
 @app.route("/api/end_set", methods=["GET"])
 @jwt_required()
 def end_set():
@@ -193,6 +235,7 @@ def end_set():
     # Reset the reps
     global_reps[current_user]['reps']=0
     global_reps[current_user]['set']=False
+    notify_pi(current_user)
     return jsonify(global_reps[current_user]['reps'])
 
 @app.route("/api/start_set", methods=["GET"])
@@ -201,7 +244,10 @@ def start_set():
     current_user = get_jwt_identity()
     # Reset the reps
     global_reps[current_user]['reps']=0
+    global_reps[current_user]['rep_qualities']=[]
     global_reps[current_user]['set']=True
+    global_reps[current_user]['set_id']=str(uuid.uuid4())
+    notify_pi(current_user)
     return jsonify({"response": global_reps[current_user]['reps']})
 
 @app.route("/api/end", methods=["GET"])
@@ -210,6 +256,7 @@ def end_workout():
     current_user = get_jwt_identity()
     global_reps[current_user]['workout']=False
     global_reps[current_user]['set']=False
+    notify_pi(current_user)
     return jsonify("Workout Ended")
 
 
@@ -229,23 +276,61 @@ def count_rep():
         print(f"Error processing data: {e}")
         return jsonify({"error": "Failed to process data"}), 500
 
+@app.route("/api/rep_quality", methods=["POST"])
+def score_rep():
+    # Quality of one rep, scored on the Pi as soon as the rep closed
+    try:
+        data = request.json
+        pi_id = data.get("pi_id")
+        current_user = user_pi_id.get(pi_id)
+        if current_user is None:
+            return jsonify({"response": "Idle"})
+        try:
+            rep = int(data["rep"])
+            quality = float(data["quality"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "rep and quality must be numbers"}), 400
+        if not 1 <= rep <= MAX_SET_REPS:
+            return jsonify({"error": f"Reps are numbered from 1 to {MAX_SET_REPS}"}), 400
+        if not math.isfinite(quality):
+            return jsonify({"error": "quality must be finite"}), 400
+        # A quality still queued on the Pi when the next set started belongs to the old set
+        if data.get("set_id") != global_reps[current_user].get('set_id'):
+            return jsonify({"error": "Rep quality of another set"}), 409
+        qualities = global_reps[current_user].setdefault('rep_qualities', [])
+        # Reps can arrive out of order: rep n goes to index n - 1
+        qualities.extend([None] * (rep - len(qualities)))
+        qualities[rep - 1] = quality
+        return jsonify({"response": "success"})
+    except Exception as e:
+        print(f"Error processing data: {e}")
+        return jsonify({"error": "Failed to process data"}), 500
+
 @app.route("/api/pipoll", methods=["POST"])
 def pi_poll():
     try: 
         data = request.json
-        current_user = user_pi_id.get(data)
-        if current_user is None:
-            return jsonify({"response": "Idle"})  # If pi_id is not found, return "Idle"
-        if global_reps[current_user]['workout'] and global_reps[current_user]['set']:
-            return jsonify({"response":global_reps[current_user]['exercise']})
-        elif global_reps[current_user]['workout'] and global_reps[current_user]['set']==False:
-            return jsonify({"response":"Pseudo Idle"})
-        return jsonify({"response":"Idle"})
+        return jsonify({"response": pi_state(data), "set_id": pi_set_id(data)})
+    except Exception as e:
+        print(f"Error processing data: {e}")
+        return jsonify({"error": "Failed to process data"}), 500
+
+@app.route("/api/piwait", methods=["POST"])
+def pi_wait():
+    # Long poll: held until the Pi's state changes (state_channel.py) or the timeout,
+    # answered at once if the Pi's version is not the current one
+    try:
+        data = request.json
+        pi_id = data.get("pi_id")
+        timeout = min(float(data.get("timeout", PI_WAIT_MAX)), PI_WAIT_MAX)
+        version = channel.wait(pi_id, data.get("version"), timeout)
+        return jsonify({"response": pi_state(pi_id), "set_id": pi_set_id(pi_id), "version": version})
     except Exception as e:
         print(f"Error processing data: {e}")
         return jsonify({"error": "Failed to process data"}), 500
 
 @app.route("/api/anal", methods=["POST"])
+@idempotent  # Spool replays from the Pi are only processed once
 def analyse_data():
     try:
         data = request.json
@@ -279,45 +364,50 @@ def analyse_data():
         return jsonify({"error": "Failed to process data"}), 500
     return jsonify("success"), 200
     
+def parse_json_features(data):
+    # JSON fallback of /api/process: nested {channel: {stat: [per rep]}} features
+    workout_name = data.get('name')
+    pi_id=data.get('pi_id')
+    current_user = user_pi_id.get(pi_id)
+    check_version(data.get('schema_version'))
+    # reps x 96 float32 in feature_schema order, one allocation
+    features = matrix_from_nested(data.get('sets_data'))
+    return workout_name, pi_id, current_user, features
+
 @app.route("/api/process", methods=["POST"])
+@idempotent  # Spool replays from the Pi are only processed once
 def process_data():
     try:
-        # Parse incoming form data
-        data = request.json
-
-        workout_name = data.get('name')
-        pi_id=data.get('pi_id')
-        current_user = user_pi_id.get(pi_id)
-        all_sets_data= data.get('sets_data')
-        formatted_data={
-            'accel_x': all_sets_data.get('accel_x'),
-            'accel_y': all_sets_data.get('accel_y'),
-            'accel_z': all_sets_data.get('accel_z'),
-            'vel_x': all_sets_data.get('vel_x'),
-            'vel_y': all_sets_data.get('vel_y'),
-            'vel_z': all_sets_data.get('vel_z'),
-            'pos_x': all_sets_data.get('pos_x'),
-            'pos_y': all_sets_data.get('pos_y'),
-            'pos_z': all_sets_data.get('pos_z'),
-            'mag_x': all_sets_data.get('mag_x'),
-            'mag_y': all_sets_data.get('mag_y'),
-            'mag_z': all_sets_data.get('mag_z')
-        }
-        flattened = {f"{outer}_{inner}": list(value) 
-             for outer, subdict in formatted_data.items() 
-             for inner, value in subdict.items()}
-        
-        data_to_predict=pd.DataFrame(flattened)
-
-        # Predict the rep quality using saved model weights
-        if workout_name=="Seated Cable Rows":
-            with open("seated_cable_rows.pkl", "rb") as file:
-                model = pickle.load(file)
-                rep_qualities=model.predict(data_to_predict)
-        elif workout_name=="Lat Pulldowns":
-            with open("lat_pulldowns.pkl", "rb") as file:
-                model = pickle.load(file)
-                rep_qualities=model.predict(data_to_predict)
+        # Features as a reps x 96 float32 matrix in feature_schema order
+        try:
+            if request.mimetype == FEATURES_CONTENT_TYPE:
+                # Binary upload from the Pi (upload_format.py): a view onto the body, no copy
+                header, features = decode_features(request.get_data())
+                features = check_matrix(features, header['columns'], header.get('schema_version'))
+                workout_name = header['name']
+                pi_id = header['pi_id']
+                current_user = user_pi_id.get(pi_id)
+                pi_qualities = header.get('rep_qualities')
+            else:
+                workout_name, pi_id, current_user, features = parse_json_features(request.json)
+                pi_qualities = request.json.get('rep_qualities')
+        except ValueError as e:
+            # malformed upload: a 4xx so the Pi's spool doesn't retry it forever
+            return jsonify({"error": f"Invalid features: {e}"}), 400
+
+        if pi_qualities is not None and len(pi_qualities) == len(features):
+            # Already scored on the Pi with the same models (pi/rep_scoring.py): only store them
+            rep_qualities = pi_qualities
+        else:
+            # Predict the rep quality using saved model weights (loaded once, model_registry.py),
+            # in this thread for the numpy ensembles, batched with concurrent uploads for pickled
+            # XGBoost models (inference.py)
+            try:
+                rep_qualities = batcher.predict(workout_name, features, FEATURE_COLUMNS)
+            except UnknownExercise:
+                return jsonify({"error": f"No model for exercise: {workout_name}"}), 400
+            except ValueError as e:
+                return jsonify({"error": f"Invalid features: {e}"}), 400
 
         # Format as YYYY-MM-DD
         current_date = datetime.now()
@@ -344,6 +434,7 @@ def process_data():
         # Delete user data when workout is completed
         user_pi_id.pop(pi_id)
         global_reps.pop(current_user)
+        channel.notify(pi_id)
         # Respond with JSON
         return jsonify("success"), 200
     
@@ -351,7 +442,18 @@ def process_data():
         print(f"Error processing data: {e}")
         return jsonify({"error": "Failed to process data"}), 500
 
+@app.route("/api/models", methods=["GET"])
+def model_stats():
+    # Load time, file size and hit count of every rep-quality model
+    return jsonify(registry.stats()), 200
+
+@app.route("/api/inference", methods=["GET"])
+def inference_stats():
+    # Batch sizes, queueing delay and predict time of the last inference batches
+    return jsonify(batcher.stats()), 200
+
 if __name__ == "__main__":
     with app.app_context():
         initialize_tables()  # Call directly inside app context
-    app.run(host="0.0.0.0", port=80)
+    registry.preload()  # First workout doesn't pay for unpickling
+    app.run(host="0.0.0.0", port=80, threaded=True)  # Each Pi waiting in /api/piwait holds a thread
@@ -0,0 +1,73 @@
+import itertools
+import threading
+import time
+
+"""
+NOTE:
+Push channel for the Pi's workout state (long polling), instead of every Pi
+calling /api/pipoll twice a second forever.
+
+Every pi_id has a state version, bumped by the routes that change what
+pi_state() returns (/api/start, /api/start_set, /api/end_set, /api/end,
+/api/process). /api/piwait blocks until the version differs from the one the
+Pi already has (or a timeout, then the Pi simply asks again):
+
+    Pi  --piwait(version=None)--> answered at once: state, version 7
+    Pi  --piwait(version=7)-----> held ... /api/start_set -> notify -> state, version 8
+
+Versions come from one counter seeded with the clock at startup, so a
+version from before a server restart never matches a new one: the Pi
+always gets the current state after a restart.
+"""
+
+MAX_WAIT = 25.0 # s, below the usual proxy / load balancer idle timeouts
+
+
+class StateChannel:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = {} # pi_id -> Condition on _lock, only that Pi's waiters wake up
+        self._versions = {}
+        self._counter = itertools.count(time.time_ns() // 1000)
+        self._initial = next(self._counter)
+        self.waiting = 0
+        self.notifications = 0
+
+    def _condition(self, pi_id) -> threading.Condition:
+        condition = self._changed.get(pi_id)
+        if condition is None:
+            condition = self._changed[pi_id] = threading.Condition(self._lock)
+        return condition
+
+    def version(self, pi_id) -> int:
+        with self._lock:
+            return self._versions.get(pi_id, self._initial)
+
+    def notify(self, pi_id) -> None:
+        # call after changing the state pi_state(pi_id) reads
+        with self._lock:
+            self._versions[pi_id] = next(self._counter)
+            self.notifications += 1
+            self._condition(pi_id).notify_all()
+
+    def wait(self, pi_id, known_version, timeout: float = MAX_WAIT) -> int:
+        """
+        Returns the current version as soon as it differs from known_version
+        (at once if it already does, or known_version is None), or after timeout
+        """
+        deadline = time.monotonic() + min(timeout, MAX_WAIT)
+        with self._lock:
+            condition = self._condition(pi_id)
+            self.waiting += 1
+            try:
+                while self._versions.get(pi_id, self._initial) == known_version:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    condition.wait(remaining)
+                return self._versions.get(pi_id, self._initial)
+            finally:
+                self.waiting -= 1
+
+
+channel = StateChannel()
@@ -0,0 +1 @@
+../pi/tree_ensemble.py
\ No newline at end of file
@@ -0,0 +1,238 @@
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+from tree_ensemble import TreeEnsemble
+
+"""
+NOTE:
+Exports a trained XGBoost regressor (model_training.py) to flat numpy arrays
+in one .npz, and evaluates it with numpy only: no xgboost / pandas import, no
+unpickling, no DMatrix per call. Same predictions as model.predict, bit for bit.
+
+Layout of the arrays and the evaluator: tree_ensemble.py (a link to
+pi/tree_ensemble.py, the one copy the server and the Pi both run).
+
+    export_model(model, 'lat_pulldowns.npz')
+    TreeEnsemble.load('lat_pulldowns.npz').predict(rows)
+
+    python tree_export.py    # export the .pkl models (server and pi/models), parity
+                             # check, cost of the approximate exports, benchmark
+"""
+
+# objectives whose prediction is the raw sum of the trees
+IDENTITY_OBJECTIVES = ('reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror')
+
+
+def _base_score(learner_param: dict) -> float:
+    # '7.5675E1' (xgboost 1.x/2.x) or '[7.5675E1]' (3.x, one per target)
+    return float(learner_param['base_score'].strip('[]'))
+
+
+def export_arrays(model, max_depth: int = None, threshold_dtype=np.float32,
+                  value_dtype=np.float32) -> dict[str, np.ndarray]:
+    """
+    model: XGBRegressor or Booster (squared error, gbtree, numerical splits)
+    Smaller, approximate models (eg. for the Pi, rep_scoring.py):
+        max_depth        : cut every tree at this depth, a cut split becomes a leaf
+                           with the mean value of its leaves (training rows weighted)
+        threshold_dtype,
+        value_dtype      : eg. np.float16 (the evaluator compares in float32)
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    learner = json.loads(booster.save_raw('json'))['learner']
+
+    objective = learner['objective']['name']
+    if objective not in IDENTITY_OBJECTIVES:
+        raise ValueError(f'objective {objective} not supported (predictions need a link function)')
+    if learner['gradient_booster']['name'] != 'gbtree':
+        raise ValueError(f"booster {learner['gradient_booster']['name']} not supported")
+    if int(learner['learner_model_param'].get('num_target', 1)) > 1:
+        raise ValueError('multi-target models not supported')
+
+    trees = learner['gradient_booster']['model']['trees']
+    feature, threshold, left, default_left, value, roots = [], [], [], [], [], []
+    deepest = 0
+    offset = 0
+    for tree in trees:
+        if any(tree['split_type']):
+            raise ValueError('categorical splits not supported')
+        tree_left, tree_right = tree['left_children'], tree['right_children']
+
+        # breadth first renumbering: the two children of a split are always next to
+        # each other (right = left + 1), so the evaluator only needs left
+        # value of a cut split: the mean leaf value of the training rows reaching it
+        # (leaves weighted by their hessian sum, the row count for squared error)
+        def subtree_value(node):
+            if tree_left[node] == -1:
+                return tree['split_conditions'][node] * tree['sum_hessian'][node], tree['sum_hessian'][node]
+            (lv, lh), (rv, rh) = subtree_value(tree_left[node]), subtree_value(tree_right[node])
+            return lv + rv, lh + rh
+
+        order, depth = [0], [0]
+        is_split = lambda i: tree_left[order[i]] != -1 and (max_depth is None or depth[i] < max_depth)
+        for i, node in enumerate(order):
+            if is_split(i):
+                order += [tree_left[node], tree_right[node]]
+                depth += [depth[i] + 1] * 2
+        new_index = {node: i for i, node in enumerate(order)}
+
+        for i, node in enumerate(order):
+            if not is_split(i):
+                # leaf: x < inf for any valid x, NaN goes left too: stays on itself
+                feature.append(0)
+                threshold.append(np.inf)
+                left.append(offset + i)
+                default_left.append(True)
+                if tree_left[node] == -1:
+                    value.append(tree['split_conditions'][node]) # leaf value
+                else:
+                    weighted, hessian = subtree_value(node)
+                    value.append(weighted / hessian if hessian > 0 else 0.0)
+            else:
+                feature.append(tree['split_indices'][node])
+                threshold.append(tree['split_conditions'][node])
+                left.append(offset + new_index[tree_left[node]])
+                default_left.append(bool(tree['default_left'][node]))
+                value.append(0.0)
+        roots.append(offset)
+        deepest = max(deepest, depth[-1])
+        offset += len(order)
+
+    left = np.array(left)
+    is_leaf = left == np.arange(offset)
+    right = np.where(is_leaf, left, left + 1)
+    threshold = np.array(threshold, dtype=np.float32)
+    value = np.array(value, dtype=np.float32)
+    with np.errstate(over='ignore'):
+        if np.isinf(threshold.astype(threshold_dtype)[~is_leaf]).any() or np.isinf(value.astype(value_dtype)).any():
+            raise ValueError(f'thresholds or leaf values overflow {np.dtype(threshold_dtype).name}')
+
+    n_features = int(learner['learner_model_param']['num_feature'])
+    index_dtype = np.min_scalar_type(offset) # uint8 / uint16 / uint32: evaluators widen on load
+    names = booster.feature_names or [f'f{i}' for i in range(n_features)]
+    return {
+        'feature': np.array(feature, dtype=np.min_scalar_type(n_features)),
+        'threshold': threshold.astype(threshold_dtype),
+        'left': left.astype(index_dtype),
+        'right': right.astype(index_dtype),
+        'default_left': np.array(default_left, dtype=bool),
+        'value': value.astype(value_dtype),
+        'roots': np.array(roots, dtype=index_dtype),
+        'base_score': np.float32(_base_score(learner['learner_model_param'])),
+        'max_depth': np.int32(deepest),
+        'feature_names': np.array(names),
+    }
+
+
+def export_model(model, path: str, **options) -> None:
+    # written next to the target and renamed: model_registry never sees half a file
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as file:
+        np.savez(file, **export_arrays(model, **options))
+    os.replace(tmp, path)
+
+
+## ---- EXPORT / PARITY / BENCHMARK ---- ##
+
+def _best_ms(fn, repeats: int = 20) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1e3
+
+
+def near_threshold_rows(ensemble: TreeEnsemble, n_rows: int = 5000, seed: int = 0) -> np.ndarray:
+    # random rows around the thresholds actually used, exact ties, and NaNs
+    rng = np.random.default_rng(seed)
+    n_features = len(ensemble.feature_names)
+    splits = ensemble.threshold < np.inf
+    rows = rng.standard_normal((n_rows, n_features)).astype(np.float32) * 50
+    for column in range(n_features):
+        used = ensemble.threshold[splits & (ensemble.feature == column)]
+        if len(used):
+            picks = rng.choice(used, n_rows)
+            rows[:, column] = np.where(rng.random(n_rows) < 0.5, picks,
+                                       picks + rng.standard_normal(n_rows).astype(np.float32) * np.abs(picks) * 0.01)
+    rows[rng.random(rows.shape) < 0.02] = np.nan
+    return rows
+
+
+def check_parity(model, ensemble: TreeEnsemble) -> None:
+    rows = near_threshold_rows(ensemble)
+    expected = model.predict(rows)
+    got = ensemble.predict(rows)
+    assert np.array_equal(expected, got), f'max difference {np.nanmax(np.abs(expected - got))}'
+
+
+# smaller / approximate exports: what they cost on rows close to the split thresholds
+APPROXIMATIONS = [
+    {'threshold_dtype': np.float16},
+    {'threshold_dtype': np.float16, 'value_dtype': np.float16},
+    {'max_depth': 4},
+    {'max_depth': 3},
+]
+
+
+def compare_approximations(model, ensemble: TreeEnsemble) -> None:
+    rows = near_threshold_rows(ensemble, seed=1)
+    expected = model.predict(rows)
+    for options in APPROXIMATIONS:
+        try:
+            arrays = export_arrays(model, **options)
+        except ValueError as e:
+            print(f'    {options}: {e}')
+            continue
+        body = io.BytesIO()
+        np.savez(body, **arrays)
+        error = np.abs(TreeEnsemble(arrays).predict(rows) - expected)
+        name = ', '.join(f'{key}={getattr(value, "__name__", value)}' for key, value in options.items())
+        print(f'    {name:<44}{len(body.getvalue()):>7} B  max error {error.max():>7.3f}'
+              f'  rows changed {np.mean(error > 0):>6.1%}')
+
+
+if __name__ == '__main__':
+    import pickle
+    import subprocess
+    import sys
+
+    from model_registry import MODEL_DIR, MODEL_FILES
+
+    PI_MODEL_DIR = os.path.join(MODEL_DIR, '..', 'pi', 'models')
+    os.makedirs(PI_MODEL_DIR, exist_ok=True)
+
+    for exercise, file in MODEL_FILES.items():
+        npz_path = os.path.join(MODEL_DIR, file)
+        pkl_path = os.path.splitext(npz_path)[0] + '.pkl'
+        with open(pkl_path, 'rb') as f:
+            model = pickle.load(f)
+        export_model(model, npz_path)
+        ensemble = TreeEnsemble.load(npz_path)
+        check_parity(model, ensemble)
+        print(f'{exercise}: {len(ensemble.roots)} trees, {len(ensemble.value)} nodes, depth {ensemble.max_depth},'
+              f' {os.path.getsize(npz_path)} B npz ({os.path.getsize(pkl_path)} B pkl), identical predictions')
+        compare_approximations(model, ensemble)
+
+        # the Pi scores reps with the same arrays (pi/rep_scoring.py)
+        export_model(model, os.path.join(PI_MODEL_DIR, file))
+
+        # cold start: fresh interpreter, import + load + first prediction
+        first = np.zeros((1, len(ensemble.feature_names)), dtype=np.float32)
+        for name, code in [('pickle', f'import pickle, numpy; m = pickle.load(open({pkl_path!r}, "rb")); '
+                                      f'm.predict(numpy.zeros((1, {first.shape[1]}), numpy.float32))'),
+                           ('npz', f'import numpy; from tree_ensemble import TreeEnsemble; '
+                                   f'TreeEnsemble.load({npz_path!r}).predict(numpy.zeros((1, {first.shape[1]})))')]:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-W', 'ignore', '-c', code], check=True, cwd=MODEL_DIR)
+            print(f'    cold start {name:<7}{(time.perf_counter() - start) * 1e3:>9.1f} ms')
+
+        rng = np.random.default_rng(1)
+        for n_rows in (1, 12, 120, 1200):
+            rows = rng.standard_normal((n_rows, len(ensemble.feature_names))).astype(np.float32)
+            print(f'    {n_rows:>5} rows  xgboost {_best_ms(lambda: model.predict(rows)):>7.3f} ms'
+                  f'  numpy {_best_ms(lambda: ensemble.predict(rows)):>7.3f} ms')
@@ -0,0 +1 @@
+../pi/upload_format.py
\ No newline at end of file
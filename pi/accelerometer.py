@@ -1,6 +1,9 @@
 # import smbus2
+import struct
 import time
 
+import numpy as np
+
 ## Default Bus
 from i2c_bus import bus
 
@@ -23,8 +26,57 @@ LIS3DH_REG_OUT_Y_H = 0x2B  # Y-axis MSB
 LIS3DH_REG_OUT_Z_L = 0x2C  # Z-axis LSB
 LIS3DH_REG_OUT_Z_H = 0x2D  # Z-axis MSB
 
-
-def lis3dh_init() -> None:
+# register address MSB: auto-increment on multi-byte reads (page 26 of the datasheet)
+LIS3DH_AUTO_INCREMENT = 0x80
+# OUT_X_L .. OUT_Z_H: three little-endian two's complement words
+LIS3DH_OUT_XYZ = struct.Struct('<hhh')
+
+## Full scale: CTRL_REG4 FS[1:0] (bits 5:4)
+LIS3DH_FULL_SCALES = {2: 0b00, 4: 0b01, 8: 0b10, 16: 0b11}
+full_scale = 2 # g, chip default
+
+## Output data rate: CTRL_REG1 ODR[3:0] (bits 7:4)
+LIS3DH_ODRS = {1: 0b0001, 10: 0b0010, 25: 0b0011, 50: 0b0100, 100: 0b0101, 200: 0b0110, 400: 0b0111}
+odr = 100 # Hz, set by lis3dh_init
+
+## FIFO (page 21 and 40-41 of the datasheet)
+LIS3DH_REG_FIFO_CTRL_REG = 0x2E
+LIS3DH_REG_FIFO_SRC_REG = 0x2F
+LIS3DH_FIFO_EN = 0x40           # CTRL_REG5
+LIS3DH_FIFO_MODE_BYPASS = 0x00  # FIFO_CTRL_REG FM[1:0] (bits 7:6)
+LIS3DH_FIFO_MODE_STREAM = 0x80  # keeps the latest 32 samples, oldest overwritten
+LIS3DH_FIFO_OVRN = 0x40         # FIFO_SRC_REG: all 32 levels full
+LIS3DH_FIFO_FSS = 0x1F          # FIFO_SRC_REG: unread samples
+LIS3DH_FIFO_SIZE = 32
+# SMBus blocks are at most 32 bytes: 5 samples (30 bytes) per transaction,
+# reading from OUT_X_L rolls over from OUT_Z_H back to OUT_X_L in FIFO mode
+LIS3DH_FIFO_BURST = 5
+fifo_overruns = 0 # drains that found the FIFO full (samples may have been lost)
+
+
+def lis3dh_set_range(g: int) -> None:
+    # +/- 2, 4, 8 or 16 g, keeps the other CTRL_REG4 bits
+    global full_scale
+    if g not in LIS3DH_FULL_SCALES:
+        raise ValueError(f'LIS3DH full scale must be one of {list(LIS3DH_FULL_SCALES)} g')
+    reg4 = bus.read_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG4)
+    reg4 = (reg4 & ~0b0011_0000) | (LIS3DH_FULL_SCALES[g] << 4)
+    bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG4, reg4)
+    full_scale = g
+
+
+def lis3dh_set_odr(hz: int) -> None:
+    # keeps the low power / axis enable bits of CTRL_REG1
+    global odr
+    if hz not in LIS3DH_ODRS:
+        raise ValueError(f'LIS3DH output data rate must be one of {list(LIS3DH_ODRS)} Hz')
+    reg1 = bus.read_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG1)
+    reg1 = (reg1 & 0x0F) | (LIS3DH_ODRS[hz] << 4)
+    bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG1, reg1)
+    odr = hz
+
+
+def lis3dh_init(g: int = 2, hz: int = 100) -> None:
     print('Initialising LIS3DH...')
     # enable high resolution, xyz axes, and 100Hz sampling
     global LIS3DH_ADDRESS
@@ -48,8 +100,18 @@ def lis3dh_init() -> None:
         # set HPF
         bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG2, 0b0000_0010)
 
+    lis3dh_set_range(g)
+    lis3dh_set_odr(hz)
+
 
 def lis3dh_read_xyz_raw() -> tuple[int, int, int]:
+    # signed raw counts, all six output registers in one I2C transaction
+    data = bus.read_i2c_block_data(LIS3DH_ADDRESS, LIS3DH_REG_OUT_X_L | LIS3DH_AUTO_INCREMENT, 6)
+    return LIS3DH_OUT_XYZ.unpack(bytes(data))
+
+
+def lis3dh_read_xyz_raw_bytewise() -> tuple[int, int, int]:
+    # previous read: six single-byte transactions, unsigned
     X_L = bus.read_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_OUT_X_L)
     X_H = bus.read_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_OUT_X_H)
 
@@ -66,23 +128,60 @@ def lis3dh_read_xyz_raw() -> tuple[int, int, int]:
     return (x, y, z)
 
 
-def lis3dh_read_xyz() -> tuple[float, float, float]:#Changing from two's complement
+def lis3dh_read_xyz() -> tuple[float, float, float]:
+    # in g, at the full scale set in CTRL_REG4
     x, y, z = lis3dh_read_xyz_raw()
+    scale = full_scale/32768
+    return (x*scale, y*scale, z*scale)
+
+## ---- FIFO ---- ##
+
+def lis3dh_fifo_enable(hz: int = None) -> None:
+    """
+    32-level FIFO in stream mode: the chip samples at hz on its own and
+    lis3dh_fifo_read() drains whatever accumulated since the last call
+    """
+    if hz is not None:
+        lis3dh_set_odr(hz)
+    reg5 = bus.read_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG5)
+    bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG5, reg5 | LIS3DH_FIFO_EN)
+    lis3dh_fifo_clear()
+
+
+def lis3dh_fifo_clear() -> None:
+    # going through bypass mode empties the FIFO (eg. stale samples from before a set)
+    bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_FIFO_CTRL_REG, LIS3DH_FIFO_MODE_BYPASS)
+    bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_FIFO_CTRL_REG, LIS3DH_FIFO_MODE_STREAM)
+
+
+def lis3dh_fifo_disable() -> None:
+    bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_FIFO_CTRL_REG, LIS3DH_FIFO_MODE_BYPASS)
+    reg5 = bus.read_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG5)
+    bus.write_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_CTRL_REG5, reg5 & ~LIS3DH_FIFO_EN)
+
+
+def lis3dh_fifo_read(now: float = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Every sample waiting in the FIFO, oldest first: (n timestamps, n x 3 in g)
+    The chip doesn't timestamp samples: the newest one is taken as 'now'
+    (time.time() by default) and the others are spaced 1/odr before it.
+    """
+    global fifo_overruns
+    src = bus.read_byte_data(LIS3DH_ADDRESS, LIS3DH_REG_FIFO_SRC_REG)
+    n = LIS3DH_FIFO_SIZE if src & LIS3DH_FIFO_OVRN else src & LIS3DH_FIFO_FSS
+    if src & LIS3DH_FIFO_OVRN:
+        fifo_overruns += 1
+
+    data = bytearray()
+    for start in range(0, n, LIS3DH_FIFO_BURST):
+        count = min(LIS3DH_FIFO_BURST, n - start)
+        data += bytes(bus.read_i2c_block_data(LIS3DH_ADDRESS, LIS3DH_REG_OUT_X_L | LIS3DH_AUTO_INCREMENT, 6 * count))
+
+    xyz = np.frombuffer(bytes(data), dtype='<i2').reshape(n, 3) * (full_scale/32768)
+    now = time.time() if now is None else now
+    times = now - np.arange(n - 1, -1, -1) / odr
+    return times, xyz
 
-    if x & 0x8000:
-        x -= 0x10000
-    if y & 0x8000:
-        y -= 0x10000
-    if z & 0x8000:
-        z -= 0x10000
-    
-    #Comment this section out if you want raw data
-    max_value = 2 #Since scale is +/- 2g by default
-    x = x/32768 * max_value
-    y = y/32768 * max_value
-    z = z/32768 * max_value
-
-    return (x, y, z)
 
 if __name__ == "__main__":
     lis3dh_init()
@@ -0,0 +1,254 @@
+"""
+NOTE:
+Benchmarks of the Pi signal-processing hot paths on synthetic, rep-shaped sets.
+
+    streaming (per sample, ns/sample) : KalmanFilter3D.step, KalmanFilterBank.step,
+                                        MovingAverage.update, Workout.update,
+                                        OnlineRepSegmenter (update + live rep commits)
+    end of set (per set, ms/set)      : sort_reps, separate_reps, give_feedback,
+                                        process_rep_to_features (every rep),
+                                        line_analysis.distance_analysis (every rep)
+
+    python benchmark.py --out bench.json [--compare previous.json] [--quick]
+
+Results are saved as JSON (with the git commit) so runs on different commits
+can be compared: --compare prints the ratio against an earlier file.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+from filtering import KalmanFilter3D, KalmanFilterBank, MovingAverage
+from workout import Workout
+from rep_analysis import SetBuffer, OnlineRepSegmenter, sort_reps, separate_reps, give_feedback
+from model_preprocessing import process_rep_to_features, clear_workout_features
+import line_analysis
+
+TS = 0.01
+# (reps, samples) per synthetic set
+SET_SIZES = [(5, 200), (5, 2000), (10, 1000), (20, 5000), (50, 5000), (50, 20000)]
+QUICK_SET_SIZES = [(5, 200), (10, 1000)]
+
+
+## ---- SYNTHETIC DATA ---- ##
+
+def synthetic_set(n_reps: int, n_samples: int, ts: float = TS, seed: int = 0) -> SetBuffer:
+    """
+    n_reps sinusoidal reps along x (velocity peak mid-rep), noise on every axis,
+    magnetometer z dipping at each rep start, live rep markers slightly after the
+    velocity peaks (like Workout.update)
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples) * ts
+    rep_len = n_samples / n_reps
+    phase = (np.arange(n_samples) % rep_len) / rep_len
+
+    vel = np.zeros((n_samples, 3))
+    vel[:, 0] = 0.5 * np.sin(np.pi * phase) ** 2
+    vel += 0.02 * rng.standard_normal((n_samples, 3))
+    accel = np.gradient(vel, ts, axis=0) * ts + 0.01 * rng.standard_normal((n_samples, 3))
+    pos = np.cumsum(vel, axis=0) * ts
+    magn = np.zeros((n_samples, 3))
+    magn[:, 2] = -60 * np.exp(-((phase * rep_len) / 5) ** 2) + rng.standard_normal(n_samples)
+
+    data = SetBuffer(ts, capacity=n_samples)
+    for i in range(n_samples):
+        data.append(accel[i], vel[i], pos[i], magn[i], t[i])
+    for rep in range(1, n_reps):
+        data.mark_rep(int(rep * rep_len + rep_len / 2 + rng.integers(0, max(1, rep_len / 10))) % n_samples)
+    return data
+
+
+## ---- TIMING ---- ##
+
+def timed(fn, repeats: int) -> list[float]:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        with contextlib.redirect_stdout(io.StringIO()): # analysis code prints a lot
+            fn()
+        times.append(time.perf_counter_ns() - start)
+    return times
+
+
+def result(name: str, kind: str, n_reps: int, n_samples: int, times_ns: list[float], per: int = 1) -> dict:
+    # per: divide by the number of samples for streaming benchmarks
+    scale = 1 / per if kind == 'per_sample' else 1e-6
+    values = [t * scale for t in times_ns]
+    return {
+        'name': name,
+        'kind': kind,
+        'reps': n_reps,
+        'samples': n_samples,
+        'unit': 'ns/sample' if kind == 'per_sample' else 'ms/set',
+        'best': min(values),
+        'median': float(np.median(values)),
+        'repeats': len(values),
+    }
+
+
+## ---- BENCHMARKS ---- ##
+
+def bench_streaming(data: SetBuffer, n_reps: int, repeats: int) -> list[dict]:
+    n = len(data)
+    accel = data.accel.tolist()
+    accel_x = data.accel[:, 0].tolist()
+    vel = data.vel.tolist()
+    vel_x = data.vel[:, 0].tolist()
+    magn = data.magn.tolist()
+    results = []
+
+    def kalman_exact():
+        f = KalmanFilter3D(TS)
+        for x in accel_x:
+            f.step(x)
+
+    def kalman_steady():
+        f = KalmanFilter3D(TS, steady_state=True)
+        for x in accel_x:
+            f.step(x)
+
+    def kalman_bank():
+        f = KalmanFilterBank(TS, 3, steady_state=True)
+        for xyz in accel:
+            f.step(xyz)
+
+    def moving_average():
+        f = MovingAverage(50)
+        for x in accel_x:
+            f.update(x)
+
+    live_reps = set(data.rep_indices.tolist())
+
+    def online_segmenter():
+        segmenter = OnlineRepSegmenter(0)
+        for i, x in enumerate(vel_x):
+            segmenter.update(x)
+            if i in live_reps:
+                segmenter.mark_rep()
+
+    def workout_update():
+        w = Workout('Seated Cable Rows', init_time=0.0)
+        for i in range(n):
+            w.update(vel[i], magn[i], now=i * TS)
+
+    for name, fn in [('KalmanFilter3D.step', kalman_exact),
+                     ('KalmanFilter3D.step[steady_state]', kalman_steady),
+                     ('KalmanFilterBank.step[3ch,steady_state]', kalman_bank),
+                     ('MovingAverage.update', moving_average),
+                     ('Workout.update', workout_update),
+                     ('OnlineRepSegmenter', online_segmenter)]:
+        results.append(result(name, 'per_sample', n_reps, n, timed(fn, repeats), per=n))
+    return results
+
+
+def bench_end_of_set(data: SetBuffer, n_reps: int, repeats: int, distance_max_samples: int) -> list[dict]:
+    n = len(data)
+    live_reps = data.rep_indices.copy()
+    sel = Workout('Seated Cable Rows').select
+    results = []
+
+    def restore():
+        data.rep_indices = live_reps
+
+    def run_sort_reps():
+        restore()
+        sort_reps(data, data.rep_indices, sel)
+
+    def run_separate_reps():
+        restore()
+        separate_reps(data, sel)
+
+    restore()
+    with contextlib.redirect_stdout(io.StringIO()):
+        accel_reps, vel_reps, pos_reps, mag_reps, _ = separate_reps(data, sel)
+
+    def run_give_feedback():
+        give_feedback(accel_reps, vel_reps, pos_reps, mag_reps, data.sample_times, data.rep_indices)
+
+    def run_features():
+        features = clear_workout_features(None)
+        for i in range(len(accel_reps)):
+            process_rep_to_features(accel_reps[i], vel_reps[i], pos_reps[i], mag_reps[i], features)
+
+    def run_distance_analysis():
+        for pos_rep in pos_reps:
+            line_analysis.distance_analysis(pos_rep)
+
+    benchmarks = [('sort_reps', run_sort_reps),
+                  ('separate_reps', run_separate_reps),
+                  ('give_feedback', run_give_feedback),
+                  ('process_rep_to_features', run_features)]
+    # was quadratic in the rep length (kept the cap to bench older commits)
+    if n <= distance_max_samples:
+        benchmarks.append(('line_analysis.distance_analysis', run_distance_analysis))
+
+    for name, fn in benchmarks:
+        results.append(result(name, 'per_set', n_reps, n, timed(fn, repeats)))
+    restore()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(set_sizes, repeats: int = 5, distance_max_samples: int = 20000) -> dict:
+    results = []
+    for n_reps, n_samples in set_sizes:
+        data = synthetic_set(n_reps, n_samples)
+        results += bench_streaming(data, n_reps, repeats)
+        results += bench_end_of_set(data, n_reps, repeats, distance_max_samples)
+        print(f'{n_reps} reps / {n_samples} samples done')
+
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': results,
+    }
+
+
+def compare(current: dict, previous: dict) -> None:
+    key = lambda r: (r['name'], r['reps'], r['samples'])
+    before = {key(r): r for r in previous['results']}
+    print(f"{'benchmark':<42}{'reps':>5}{'samples':>8}{'before':>12}{'now':>12}{'ratio':>8}")
+    for r in current['results']:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        print(f"{r['name']:<42}{r['reps']:>5}{r['samples']:>8}{old['best']:>12.3f}{r['best']:>12.3f}"
+              f"{r['best'] / old['best']:>8.2f}  {r['unit']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--quick', action='store_true', help='small sets only')
+    args = parser.parse_args()
+
+    report = run(QUICK_SET_SIZES if args.quick else SET_SIZES, args.repeats)
+    with open(args.out, 'w') as file:
+        json.dump(report, file, indent=1)
+
+    for r in report['results']:
+        print(f"{r['name']:<42}{r['reps']:>5}{r['samples']:>8}{r['best']:>12.3f} {r['unit']}")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
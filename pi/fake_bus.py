@@ -0,0 +1,292 @@
+"""
+NOTE:
+Off-device stand-in for i2c_bus.bus (an smbus2.SMBus), with register-level models
+of the two sensors, so accelerometer.py / magnet.py run unchanged on any Linux box:
+
+    bus = FakeBus({0x18: FakeLIS3DH(source), 0x0C: FakeMLX90393(source)})
+    accelerometer.bus = magnet.bus = bus
+
+source() is called for the next sample:
+    LIS3DH   : when OUT_X_L (0x28) is read, returns (x, y, z) in g
+               in FIFO stream mode: once per 1/ODR of clock() time instead
+    MLX90393 : on every read measurement command, returns raw (x, y, z) counts
+Addresses without a device raise OSError like a NACK on the real bus.
+"""
+
+import errno
+import time
+from collections import deque
+
+## LIS3DH registers
+LIS3DH_WHO_AM_I = 0x0F
+LIS3DH_CTRL_REG1 = 0x20
+LIS3DH_CTRL_REG4 = 0x23
+LIS3DH_CTRL_REG5 = 0x24
+LIS3DH_OUT_X_L = 0x28
+LIS3DH_OUT_Z_H = 0x2D
+LIS3DH_FIFO_CTRL_REG = 0x2E
+LIS3DH_FIFO_SRC_REG = 0x2F
+LIS3DH_AUTO_INCREMENT = 0x80
+LIS3DH_FIFO_EN = 0x40
+LIS3DH_FIFO_SIZE = 32
+LIS3DH_ODRS = (0, 1, 10, 25, 50, 100, 200, 400) # CTRL_REG1 ODR[3:0] -> Hz
+
+## MLX90393 commands
+MLX90393_CMD_READ = 0x4E
+
+
+class FakeLIS3DH:
+    """
+    Register file of the LIS3DH, the OUT_* registers are loaded from source()
+    in the same left-justified two's complement format as the chip
+    """
+    def __init__(self, source=None, clock=time.monotonic):
+        self.regs = bytearray(0x40)
+        self.regs[LIS3DH_WHO_AM_I] = 0x33
+        self.source = source
+
+        # FIFO: samples arrive at the ODR of clock() time while it is enabled
+        self.clock = clock
+        self.fifo = deque()
+        self.fifo_start = 0.0 # sample k is taken at fifo_start + k / odr
+        self.fifo_taken = 0
+        self.fifo_overrun = False
+
+    @property
+    def odr(self) -> int:
+        return LIS3DH_ODRS[(self.regs[LIS3DH_CTRL_REG1] >> 4) & 0b0111]
+
+    @property
+    def fifo_mode(self) -> int:
+        # FIFO_CTRL_REG FM[1:0]: 0 bypass, 1 FIFO, 2 stream (0 while FIFO_EN is off)
+        if not self.regs[LIS3DH_CTRL_REG5] & LIS3DH_FIFO_EN:
+            return 0
+        return self.regs[LIS3DH_FIFO_CTRL_REG] >> 6
+
+    def _fill(self) -> None:
+        # every sample the chip would have taken since the last access
+        if self.fifo_mode == 0 or self.odr == 0:
+            return
+        due = int((self.clock() - self.fifo_start) * self.odr + 1e-9)
+        while self.fifo_taken < due:
+            self.fifo_taken += 1
+            if len(self.fifo) == LIS3DH_FIFO_SIZE:
+                self.fifo_overrun = True
+                if self.fifo_mode == 1: # FIFO mode stops when full
+                    continue
+                self.fifo.popleft()
+            self.fifo.append(self.source() if self.source is not None else (0.0, 0.0, 0.0))
+
+    def _fifo_src(self) -> int:
+        n = len(self.fifo)
+        return (0x40 if n == LIS3DH_FIFO_SIZE else 0) | (0x20 if n == 0 else 0) | (n & 0x1F)
+
+    @property
+    def full_scale(self) -> int:
+        # CTRL_REG4 FS[1:0] : +/- 2, 4, 8, 16 g
+        return (2, 4, 8, 16)[(self.regs[LIS3DH_CTRL_REG4] >> 4) & 0b11]
+
+    def load(self, x: float, y: float, z: float) -> None:
+        for i, value in enumerate((x, y, z)):
+            raw = int(round(value / self.full_scale * 32768))
+            raw = max(-32768, min(32767, raw)) & 0xFFFF
+            self.regs[LIS3DH_OUT_X_L + 2*i] = raw & 0xFF
+            self.regs[LIS3DH_OUT_X_L + 2*i + 1] = raw >> 8
+
+    def read(self, reg: int) -> int:
+        if self.fifo_mode:
+            self._fill()
+            if reg == LIS3DH_FIFO_SRC_REG:
+                return self._fifo_src()
+            if reg == LIS3DH_OUT_X_L and self.fifo:
+                self.load(*self.fifo.popleft()) # reading the output registers pops
+            return self.regs[reg]
+
+        if reg == LIS3DH_OUT_X_L and self.source is not None:
+            self.load(*self.source())
+        return self.regs[reg]
+
+    def read_block(self, reg: int, length: int) -> list[int]:
+        # address MSB set: auto-increment, otherwise the same register over and over
+        step = 1 if reg & LIS3DH_AUTO_INCREMENT else 0
+        reg &= ~LIS3DH_AUTO_INCREMENT
+        out = []
+        for _ in range(length):
+            out.append(self.read(reg))
+            reg += step
+            # FIFO enabled: OUT_Z_H rolls over to OUT_X_L (next sample)
+            if self.fifo_mode and reg == LIS3DH_OUT_Z_H + 1:
+                reg = LIS3DH_OUT_X_L
+        return out
+
+    def write(self, reg: int, value: int | list[int]) -> None:
+        values = value if isinstance(value, list) else [value]
+        reg &= ~LIS3DH_AUTO_INCREMENT
+        was_running = self.fifo_mode
+        for i, v in enumerate(values):
+            self.regs[reg + i] = v & 0xFF
+        if not was_running or not self.fifo_mode:
+            # bypass empties the FIFO, (re)starting it starts the sample clock
+            self.fifo.clear()
+            self.fifo_overrun = False
+            self.fifo_start = self.clock()
+            self.fifo_taken = 0
+
+
+class FakeMLX90393:
+    """
+    Answers the read measurement command with
+    [status, x_msb, x_lsb, y_msb, y_lsb, z_msb, z_lsb] from source()
+    """
+    def __init__(self, source=None):
+        self.source = source
+        self.status = 0x00
+        self.commands = []
+
+    def read_block(self, cmd: int, length: int) -> list[int]:
+        if cmd != MLX90393_CMD_READ:
+            return [self.status] * length
+        x, y, z = self.source() if self.source is not None else (0, 0, 0)
+        frame = [self.status]
+        for value in (x, y, z):
+            raw = int(value) & 0xFFFF
+            frame += [raw >> 8, raw & 0xFF]
+        return frame[:length]
+
+    def read(self, reg: int = None) -> int:
+        return self.status
+
+    def write(self, reg: int, value: int = None) -> None:
+        self.commands.append((reg, value))
+
+
+class FakeBus:
+    """
+    Subset of the smbus2.SMBus API used by the drivers
+    """
+    def __init__(self, devices: dict[int, object]):
+        self.devices = devices
+        self.transactions = 0
+
+    def _device(self, addr: int):
+        self.transactions += 1
+        if addr not in self.devices:
+            raise OSError(errno.EREMOTEIO, 'Remote I/O error')
+        return self.devices[addr]
+
+    def read_byte_data(self, addr: int, reg: int) -> int:
+        return self._device(addr).read(reg)
+
+    def write_byte_data(self, addr: int, reg: int, value: int) -> None:
+        self._device(addr).write(reg, value)
+
+    def read_i2c_block_data(self, addr: int, reg: int, length: int) -> list[int]:
+        return self._device(addr).read_block(reg, length)
+
+    def write_i2c_block_data(self, addr: int, reg: int, data: list[int]) -> None:
+        self._device(addr).write(reg, list(data))
+
+    def write_block_data(self, addr: int, reg: int, data: list[int]) -> None:
+        self._device(addr).write(reg, list(data))
+
+    def read_byte(self, addr: int) -> int:
+        return self._device(addr).read()
+
+    def write_byte(self, addr: int, value: int) -> None:
+        self._device(addr).write(value)
+
+    def close(self) -> None:
+        pass
+
+
+if __name__ == '__main__':
+    # LIS3DH decode and FIFO, magnetometer sampler, off-device: python fake_bus.py
+    import numpy as np
+    import accelerometer
+
+    samples = [(0.0, 0.0, 1.0), (-1.5, 0.25, -0.001), (1.999, -2.0, 0.5), (-0.75, 3.9, -7.2)]
+    source = iter(samples * 8)
+    lis3dh = FakeLIS3DH(source=lambda: next(source))
+    bus = FakeBus({accelerometer.LIS3DH_ADDRESS: lis3dh})
+    accelerometer.bus = bus
+
+    for g in (2, 4, 8, 16):
+        accelerometer.lis3dh_set_range(g)
+        assert lis3dh.full_scale == g
+        for expected in samples:
+            clipped = [max(-g, min(g * 32767/32768, v)) for v in expected]
+            before = bus.transactions
+            xyz = accelerometer.lis3dh_read_xyz()
+            assert bus.transactions - before == 1
+            # same registers decoded the old way (six reads, manual two's complement)
+            lis3dh.source = None
+            raw = [v - 0x10000 if v & 0x8000 else v for v in accelerometer.lis3dh_read_xyz_raw_bytewise()]
+            assert tuple(raw) == accelerometer.lis3dh_read_xyz_raw()
+            lis3dh.source = lambda: next(source)
+            assert all(abs(a - b) <= g/32768 for a, b in zip(xyz, clipped)), (g, xyz, clipped)
+        print(f'+/-{g:>2} g ok')
+
+    # FIFO stream mode, on a manual clock
+    now = [0.0]
+    counter = iter(range(10**6))
+    lis3dh = FakeLIS3DH(source=lambda: (next(counter) / 1024, 0.5, -0.25), clock=lambda: now[0])
+    bus = FakeBus({accelerometer.LIS3DH_ADDRESS: lis3dh})
+    accelerometer.bus = bus
+    accelerometer.lis3dh_set_range(2)
+    accelerometer.lis3dh_fifo_enable(200)
+
+    now[0] += 0.1 # 20 samples at 200 Hz
+    before = bus.transactions
+    times, xyz = accelerometer.lis3dh_fifo_read(now=now[0])
+    assert len(xyz) == 20 and bus.transactions - before == 1 + 4 # FIFO_SRC + 4 bursts of 5
+    assert (xyz[:, 0] == np.arange(20) / 1024).all() and (xyz[:, 1:] == (0.5, -0.25)).all()
+    assert abs(times[-1] - now[0]) < 1e-12 and abs(times[1] - times[0] - 1/200) < 1e-12
+
+    now[0] += 0.5 # 100 samples: stream mode keeps the newest 32
+    times, xyz = accelerometer.lis3dh_fifo_read(now=now[0])
+    assert len(xyz) == 32 and accelerometer.fifo_overruns == 1
+    assert (xyz[:, 0] == np.arange(88, 120) / 1024).all()
+    assert len(accelerometer.lis3dh_fifo_read(now=now[0])[1]) == 0
+    print('FIFO stream mode ok')
+
+    # magnetometer sampler thread on the fake MLX90393: sample k is (k, -2k, 3k) read at t = k * 0.02
+    import magnet
+
+    def run_sampler(size: int, min_count: int) -> tuple[magnet.MagSampler, FakeMLX90393, int]:
+        reads = iter(range(10**6))
+        ticks = iter(range(10**6))
+        mlx = FakeMLX90393(source=lambda: (lambda k: (k, -2 * k, 3 * k))(next(reads)))
+        magnet.bus = FakeBus({magnet.MLX90393_ADDR: mlx})
+        sampler = magnet.MagSampler(rate=2000, size=size, read=magnet.Mag_Read, clock=lambda: next(ticks) * 0.02)
+        assert (sampler.samples_at([0.0, 1.0]) == 0).all() # nothing read yet
+        sampler.start()
+        while sampler.count < min_count:
+            time.sleep(0.001)
+        sampler.stop()
+        return sampler, mlx, sampler.count
+
+    def expected(k) -> np.ndarray:
+        k = np.asarray(k, dtype=float)
+        return np.column_stack([k, -2 * k, 3 * k])
+
+    sampler, mlx, n = run_sampler(size=1024, min_count=5)
+    assert n <= 1024 and [cmd for cmd, _ in mlx.commands] == [magnet.CMD_SB, magnet.CMD_EX]
+    k = np.arange(n)
+    assert sampler.latest == (0.02 * (n - 1), (n - 1, -2 * (n - 1), 3 * (n - 1)))
+    # zero-order hold: the sample taken at or before t, zeros before the first one
+    assert (sampler.samples_at(0.02 * k) == expected(k)).all()
+    assert (sampler.samples_at(0.02 * k + 0.01) == expected(k)).all()
+    assert (sampler.samples_at([-0.01]) == 0).all()
+    assert sampler.sample_at(0.02 * n + 5) == tuple(expected(n - 1)[0])
+    # interpolation between the two samples around t, clamped at both ends
+    assert np.allclose(sampler.samples_at(0.02 * k[:-1] + 0.01, interpolate=True), expected(k[:-1] + 0.5))
+    assert np.allclose(sampler.samples_at([-1.0, 0.02 * n + 5], interpolate=True), expected([0, n - 1]))
+    print(f'MagSampler hold / interpolation ok ({n} samples)')
+
+    # ring wrapped: only the last 8 samples are left, older times get the oldest of them (not zeros)
+    sampler, _, n = run_sampler(size=8, min_count=20)
+    k = np.arange(n - 8, n)
+    assert (sampler.samples_at(0.02 * k + 0.01) == expected(k)).all()
+    assert (sampler.samples_at([-1.0, 0.02 * (n - 9)]) == expected([n - 8, n - 8])).all()
+    assert np.allclose(sampler.samples_at(0.02 * k[:-1] + 0.01, interpolate=True), expected(k[:-1] + 0.5))
+    print(f'MagSampler ring wrap ok ({n} samples, ring of 8)')
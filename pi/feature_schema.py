@@ -0,0 +1,73 @@
+import numpy as np
+
+"""
+NOTE:
+The per-rep feature schema: which 96 features, in which order. The one copy
+(backend/feature_schema.py is a link to this file) shared by the Pi
+(model_preprocessing.py computes them, upload_format.py sends them,
+rep_scoring.py feeds them to the models), the server (validates uploads and
+builds the model input below) and the training script
+(backend/model_training.py orders its columns with it).
+
+Bump SCHEMA_VERSION whenever CHANNELS, STATS or their order change: the server
+rejects uploads from another version instead of feeding the model shifted
+columns (a Pi and a server deployed from different revisions).
+"""
+
+SCHEMA_VERSION = 1
+
+CHANNELS = [
+    'accel_x', 'accel_y', 'accel_z',
+    'vel_x', 'vel_y', 'vel_z',
+    'pos_x', 'pos_y', 'pos_z',
+    'mag_x', 'mag_y', 'mag_z'
+]
+STATS = ['mean', 'std', 'median', 'min', 'max', 'iqr', 'skew', 'kurtosis']
+# channel-major
+FEATURE_COLUMNS = [f'{channel}_{stat}' for channel in CHANNELS for stat in STATS]
+
+
+## ---- SERVER SIDE ---- ##
+
+def check_version(version) -> None:
+    # None: uploads from before the schema was versioned (same columns as version 1)
+    if version is not None and version != SCHEMA_VERSION:
+        raise ValueError(f'feature schema version {version}, expected {SCHEMA_VERSION}')
+
+
+def check_matrix(matrix: np.ndarray, columns: list[str], version=None) -> np.ndarray:
+    # reps x 96 float32 in schema order, or ValueError
+    check_version(version)
+    if list(columns) != FEATURE_COLUMNS:
+        raise ValueError('feature columns are not the schema columns (or not in schema order)')
+    if matrix.ndim != 2 or matrix.shape[1] != len(FEATURE_COLUMNS) or matrix.dtype != np.float32:
+        raise ValueError(f'features must be reps x {len(FEATURE_COLUMNS)} float32, got {matrix.shape} {matrix.dtype}')
+    return matrix
+
+
+def _nested_values(sets_data: dict, channel: str, stat: str):
+    try:
+        return sets_data[channel][stat]
+    except (KeyError, TypeError):
+        raise ValueError(f'missing feature {channel}_{stat}')
+
+
+def matrix_from_nested(sets_data: dict) -> np.ndarray:
+    """
+    {channel: {stat: [one value per rep]}} (JSON upload) -> reps x 96 float32 in
+    schema order, one allocation, ValueError if a feature is missing or short
+    """
+    n_reps = len(_nested_values(sets_data, CHANNELS[0], STATS[0]))
+    matrix = np.empty((n_reps, len(FEATURE_COLUMNS)), dtype=np.float32)
+    i = 0
+    for channel in CHANNELS:
+        for stat in STATS:
+            values = _nested_values(sets_data, channel, stat)
+            if len(values) != n_reps:
+                raise ValueError(f'{channel}_{stat} has {len(values)} values for {n_reps} reps')
+            try:
+                matrix[:, i] = values
+            except (TypeError, ValueError):
+                raise ValueError(f'{channel}_{stat} values are not numbers')
+            i += 1
+    return matrix
@@ -1,36 +1,151 @@
 import numpy as np
+from functools import lru_cache
+from math import fsum
 
 
 ## ---- MOVING AVERAGE ---- ##
 
+def _window_sums(padded: np.ndarray, size: int) -> np.ndarray:
+    """
+    Sums of the len(padded) - size windows padded[i+1:i+1+size] (along axis 0),
+    with one cumulative sum per block of size outputs, restarted at the block:
+    the rounding stays at the scale of two windows whatever the series length,
+    like update()'s running sum re-summed at every wrap
+    """
+    n = len(padded) - size
+    if n <= size:
+        # one block (eg. a FIFO drain): a plain cumsum over at most 2*size values
+        csum = np.cumsum(padded[1:], axis=0)
+        sums = csum[size - 1:].copy()
+        sums[1:] -= csum[:n - 1]
+        return sums
+    blocks = -(-n // size)
+    # zero tail so every block has its 2*size - 1 values
+    ext = np.zeros((blocks * size + size,) + padded.shape[1:])
+    ext[:len(padded)] = padded
+    segments = np.lib.stride_tricks.sliding_window_view(ext[1:], 2*size - 1, axis=0)[::size]
+    csum = np.cumsum(segments, axis=-1)
+    sums = csum[..., size - 1:].copy()
+    sums[..., 1:] -= csum[..., :size - 1]
+    return np.moveaxis(sums, -1, 1).reshape((blocks * size,) + padded.shape[1:])[:n]
+
+
 class MovingAverage:
     """
     NOTE:
-    Insert new value at the beginning, leave last value out
+    Ring buffer with a running sum: O(1) per update, no list rebuilding.
+    The buffer starts zero-filled, so (like the original list version) the
+    first size-1 outputs are sum(values so far) / size.
+    The running sum is re-summed exactly every time the ring wraps around,
+    which bounds the float drift at O(size) work every size updates.
     """
-    buffer: list[ float ]
+    buffer: list[ float ]   # ring, buffer[head] is the oldest value
     output: float
     size: int
 
     def __init__(self, size: int = 15):
-        self.buffer = [0.0 for _ in range(size)]
-        self.output = 0
         self.size = size
+        self.clear()
 
-    def update(self, newval: float) -> None:
-        # assert not hasattr(newval, len)
-        self.buffer = [newval, *self.buffer[:-1]]
+    def update(self, newval: float) -> float:
+        head = self.head
+        self.sum += newval - self.buffer[head]
+        self.buffer[head] = newval
 
-        # print(self.buffer)
+        head += 1
+        if head == self.size:
+            head = 0
+            self.sum = fsum(self.buffer)
+        self.head = head
 
-        self.output = sum(self.buffer) / len(self.buffer)
+        self.output = self.sum / self.size
         return self.output
+
+    def update_many(self, newvals) -> np.ndarray:
+        """
+        Same as calling update() on every value, returns the whole smoothed series
+        (blocked cumulative sum convolution over [current window, newvals])
+        """
+        newvals = np.asarray(newvals, dtype=float)
+        n = len(newvals)
+        if n == 0:
+            return np.empty(0)
+
+        history = self.buffer[self.head:] + self.buffer[:self.head] # oldest first
+        padded = np.concatenate((history, newvals))
+        out = _window_sums(padded, self.size) / self.size
+
+        self.buffer = padded[-self.size:].tolist()
+        self.head = 0
+        self.sum = fsum(self.buffer)
+        self.output = float(out[-1])
+        return out
     
     def clear(self) -> None:
         self.buffer = [0.0 for _ in range(self.size)]
+        self.head = 0
+        self.sum = 0.0
         self.output = 0
 
 
+class MultiMovingAverage:
+    """
+    MovingAverage over several channels at once (eg. magnetometer x/y/z)
+    buffer: size x channels ring, one running sum per channel
+    """
+    buffer: np.ndarray
+    output: np.ndarray
+    size: int
+    channels: int
+
+    def __init__(self, size: int = 15, channels: int = 3):
+        self.size = size
+        self.channels = channels
+        self.buffer = np.zeros((size, channels))
+        self.sum = np.zeros(channels)
+        self.clear()
+
+    def update(self, newvals) -> np.ndarray:
+        newvals = np.asarray(newvals, dtype=float)
+        head = self.head
+        self.sum += newvals - self.buffer[head]
+        self.buffer[head] = newvals
+
+        head += 1
+        if head == self.size:
+            head = 0
+            self.sum = self.buffer.sum(axis=0)
+        self.head = head
+
+        self.output = self.sum / self.size
+        return self.output
+
+    def update_many(self, newvals) -> np.ndarray:
+        """
+        newvals: n x channels, returns the n x channels smoothed series
+        """
+        newvals = np.asarray(newvals, dtype=float).reshape(-1, self.channels)
+        n = len(newvals)
+        if n == 0:
+            return np.empty((0, self.channels))
+
+        history = np.roll(self.buffer, -self.head, axis=0) # oldest first
+        padded = np.concatenate((history, newvals))
+        out = _window_sums(padded, self.size) / self.size
+
+        self.buffer[:] = padded[-self.size:]
+        self.head = 0
+        self.sum = self.buffer.sum(axis=0)
+        self.output = out[-1].copy()
+        return out
+
+    def clear(self) -> None:
+        self.buffer.fill(0.0)
+        self.sum.fill(0.0)
+        self.head = 0
+        self.output = np.zeros(self.channels)
+
+
 
 ## ---- KALMAN FILTER ---- ##
 
@@ -59,8 +174,9 @@ class KalmanFilter3D:
     K: list[ list[ float, float, float] ] # 3x1
 
     # def __init__(self, dt, A, B, Q, H, R, P, K=[0,0,0]):
-    def __init__(self, dt):
+    def __init__(self, dt, steady_state: bool = False):
         self.dt = dt
+        self.steady_state = steady_state
         self.current_state = np.array([0, 0, 0])
         # self.A = A
         self.A = np.array([
@@ -101,7 +217,19 @@ class KalmanFilter3D:
         self.acceleration = 0
         # self.K = K
 
+        if steady_state:
+            # fixed gain: P and K are the converged Riccati solution
+            P, K = steady_state_gain(dt)
+            self.P = np.array(P)
+            self.K = np.array(K)
+            self._A_rows = tuple(tuple(float(a) for a in row) for row in self.A)
+            self._K_ss = K
+            self.current_state = (0.0, 0.0, 0.0)
+
     def step(self, reading, ctrl_in=0) -> None:
+        if self.steady_state:
+            return self._step_steady(reading)
+
         # predict next state
         self.current_state = np.matmul(self.A, self.current_state) + np.matmul(self.B, np.array([ctrl_in]))
 
@@ -124,10 +252,210 @@ class KalmanFilter3D:
         self.P = np.matmul(np.eye(3) - np.matmul(K, self.H) , self.P)
 
 
+    def _step_steady(self, reading) -> None:
+        # fixed-gain predict/correct on plain floats: no matmuls, no arrays
+        (a00, a01, a02), (a10, a11, a12), (a20, a21, a22) = self._A_rows
+        k0, k1, k2 = self._K_ss
+        p, v, a = self.position, self.velocity, self.acceleration
+
+        p_pred = a00*p + a01*v + a02*a
+        v_pred = a10*p + a11*v + a12*a
+        a_pred = a20*p + a21*v + a22*a
+
+        innovation = reading - a_pred
+        self.position = p_pred + k0*innovation
+        self.velocity = v_pred + k1*innovation
+        self.acceleration = a_pred + k2*innovation
+        self.current_state = (self.position, self.velocity, self.acceleration)
+
     def print(self) -> None:
         print(f"Current State: {self.current_state}\tCovariance Coeff: {self.P}")
 
     def clear(self) -> None:
-        # could be more efficient but this is fine
-        self = KalmanFilter3D(self.dt)
-        
\ No newline at end of file
+        # rebinding self does nothing: re-run the constructor on this instance
+        self.__init__(self.dt, self.steady_state)
+
+
+@lru_cache(maxsize=None)
+def steady_state_gain(dt, tol: float = 1e-12, max_iter: int = 100_000):
+    """
+    Iterate the Riccati recursion of KalmanFilter3D(dt) until the gain stops
+    changing. Cached per dt (the noise config is fixed in the constructor).
+
+    Returns (P, K) as nested tuples so the cached value can't be mutated.
+    """
+    model = KalmanFilter3D(dt)
+    A, Q, R = model.A, model.Q, model.R
+    P = model.P.astype(float)
+    K = np.zeros(3)
+
+    for _ in range(max_iter):
+        P_pred = A @ P @ A.T + Q
+        K_new = P_pred[:, 2] / (P_pred[2, 2] + R)
+        P = P_pred - np.outer(K_new, P_pred[2])
+        converged = np.max(np.abs(K_new - K)) < tol
+        K = K_new
+        if converged:
+            break
+
+    return tuple(tuple(float(p) for p in row) for row in P), tuple(float(k) for k in K)
+
+
+class KalmanFilterBank:
+    """
+    n_channels independent copies of KalmanFilter3D stepped together
+
+    state: n_channels x 3 : [displacement, velocity, acceleration] per channel
+
+    NOTE:
+    P (and therefore K) never depends on the readings, only on A, Q, H, R,
+    so every channel shares the same 3x3 covariance and gain. Only the states
+    are stacked, and one step is a handful of ufunc calls on small arrays
+    instead of ~6 matmuls per channel.
+    With 3 channels and steady_state, one step is mostly numpy call overhead:
+    per sample, three KalmanFilter3D(steady_state=True) are faster, the bank
+    pays off in step_many (FIFO batches) or with many channels.
+    """
+    dt: float
+    n_channels: int
+    state: np.ndarray   # n_channels x 3
+    A: np.ndarray       # 3x3
+    Q: np.ndarray       # 3x3
+    R: float
+    P: np.ndarray       # 3x3 shared state covariance
+    K: np.ndarray       # 3 shared Kalman gain
+
+    def __init__(self, dt, n_channels: int = 3, steady_state: bool = False):
+        self.dt = dt
+        self.n_channels = n_channels
+        self.steady_state = steady_state
+
+        # same model as KalmanFilter3D
+        model = KalmanFilter3D(dt)
+        self.A = model.A.astype(float)
+        self.Q = model.Q
+        self.R = model.R
+        self._P0 = model.P.astype(float)
+
+        self.state = np.zeros((n_channels, 3))
+        self.P = self._P0.copy()
+        self.K = np.zeros(3)
+
+        if steady_state:
+            P, K = steady_state_gain(dt)
+            self.P = np.array(P)
+            self.K = np.array(K)
+            # x' = (I - K H) A x + K z  =>  x' = x M^T + z K^T
+            self._M_T = ((np.eye(3) - np.outer(self.K, [0, 0, 1])) @ self.A).T
+            self._M_T_powers = None # step_many
+            self._lags = 0
+
+    # per-channel views onto the stacked state, same names as KalmanFilter3D
+    @property
+    def position(self) -> np.ndarray:
+        return self.state[:, 0]
+
+    @property
+    def velocity(self) -> np.ndarray:
+        return self.state[:, 1]
+
+    @property
+    def acceleration(self) -> np.ndarray:
+        return self.state[:, 2]
+
+    def step(self, readings) -> np.ndarray:
+        if self.steady_state:
+            np.matmul(self.state, self._M_T, out=self.state)
+            self.state += np.multiply.outer(readings, self.K)
+            return self.state
+
+        # predict next state for every channel: x = A x
+        predicted = self.state @ self.A.T
+
+        # predict next variance
+        P = self.A @ self.P @ self.A.T + self.Q
+
+        # H = [0, 0, 1] => H P H^T = P[2, 2], P H^T = P[:, 2]
+        S = P[2, 2] + self.R
+        K = P[:, 2] / S
+
+        innovation = np.asarray(readings, dtype=float) - predicted[:, 2]
+        np.add(predicted, innovation[:, None] * K, out=self.state)
+
+        # (I - K H) P = P - K (H P)
+        self.P = P - np.outer(K, P[2])
+        self.K = K
+        return self.state
+
+    def step_many(self, readings) -> np.ndarray:
+        """
+        T x n_channels readings (eg. a FIFO batch), returns the T x n_channels x 3
+        states after each one, same as calling step() T times
+
+        Steady state: x_k = x_-1 M^T^(k+1) + sum_j z_(k-j) K^T M^T^j, only the
+        lags with a non-zero M^T^j contribute (M is nilpotent for this model: 3)
+        """
+        readings = np.asarray(readings, dtype=float).reshape(-1, self.n_channels)
+        T = len(readings)
+        if not self.steady_state:
+            return np.array([self.step(z).copy() for z in readings]).reshape(T, self.n_channels, 3)
+
+        powers = self._powers(T)
+        lags = min(T, self._lags)
+        states = np.zeros((T, self.n_channels, 3))
+        np.matmul(self.state, powers[1:lags + 1], out=states[:lags])
+        for j in range(lags):
+            states[j:] += readings[:T - j, :, None] * (self.K @ powers[j])
+        if T:
+            self.state[:] = states[-1]
+        return states
+
+    def _powers(self, T: int) -> np.ndarray:
+        # (M^T)^j for j = 0..T, cached, exact zeros once M^T^j vanishes
+        powers = self._M_T_powers
+        if powers is None or len(powers) < T + 1:
+            powers = [np.eye(3)]
+            for _ in range(max(T, 32)):
+                powers.append(powers[-1] @ self._M_T)
+            powers = np.array(powers)
+            nonzero = np.flatnonzero(np.abs(powers).max(axis=(1, 2)) > 0)
+            self._lags = int(nonzero[-1]) + 1
+            self._M_T_powers = powers
+        return powers
+
+    def reset(self) -> None:
+        self.state.fill(0.0)
+        if self.steady_state:
+            # P and K stay at their converged values
+            return
+        self.P[:] = self._P0
+        self.K.fill(0.0)
+
+    def clear(self) -> None:
+        self.reset()
+
+    def print(self) -> None:
+        print(f"Current State: {self.state}\tCovariance Coeff: {self.P}")
+
+
+if __name__ == "__main__":
+    # exact vs steady-state filter on the same noisy signal: outputs must converge
+    dt = 0.01
+    t = np.arange(0, 10, dt)
+    readings = np.sin(2*np.pi*0.5*t) + 0.05*np.random.randn(len(t))
+
+    exact = KalmanFilter3D(dt)
+    steady = KalmanFilter3D(dt, steady_state=True)
+    diffs = []
+    for reading in readings:
+        exact.step(reading)
+        steady.step(reading)
+        diffs.append(max(abs(exact.position - steady.position),
+                         abs(exact.velocity - steady.velocity),
+                         abs(exact.acceleration - steady.acceleration)))
+
+    settled = diffs[len(diffs)//10:]
+    print(f'steady-state gain: {steady_state_gain(dt)[1]}')
+    print(f'max |exact - steady| after warm-up: {max(settled):.3e}')
+    assert max(settled) < 1e-9, 'steady-state filter did not converge to the exact filter'
+    print('OK')
@@ -0,0 +1,92 @@
+import gzip
+import json
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+"""
+NOTE:
+One shared keep-alive HTTP client for everything the Pi sends to the backend.
+    - a single requests.Session: the TCP connection is reused across calls
+      instead of a new handshake for every poll / rep / upload
+    - (connect, read) timeouts on every call, nothing can hang forever
+    - jittered exponential backoff ("full jitter") on connection errors,
+      timeouts and 5xx responses
+    - optional gzip of large JSON bodies (Content-Encoding: gzip), the
+      server decompresses them transparently
+Non-idempotent calls (eg. /rep increments a counter) are never retried after
+the request may have reached the server.
+"""
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class HttpClient:
+    base_url: str
+    timeout: tuple[float, float]
+    retries: int
+    backoff: float
+    max_backoff: float
+    compress_min_bytes: int
+
+    def __init__(self, base_url: str, timeout: tuple[float, float] = (3.05, 10.0),
+                 retries: int = 3, backoff: float = 0.25, max_backoff: float = 5.0,
+                 compress_min_bytes: int = 1024, pool_size: int = 4):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.compress_min_bytes = compress_min_bytes
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def encode_json(self, payload, compress: bool = False) -> tuple[bytes, dict[str, str]]:
+        return self.encode(json.dumps(payload).encode(), 'application/json', compress)
+
+    def encode(self, body: bytes, content_type: str, compress: bool = False) -> tuple[bytes, dict[str, str]]:
+        # request body + headers, gzipped if asked for and worth it
+        headers = {'Content-Type': content_type}
+        if compress and len(body) >= self.compress_min_bytes:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        return body, headers
+
+    def post_json(self, path: str, payload, compress: bool = False, idempotent: bool = True,
+                  headers: dict = None, timeout=None) -> requests.Response:
+        body, request_headers = self.encode_json(payload, compress)
+        if headers:
+            request_headers.update(headers)
+        return self.post(path, body, request_headers, idempotent=idempotent, timeout=timeout)
+
+    def post(self, path: str, body: bytes, headers: dict, idempotent: bool = True,
+             timeout=None) -> requests.Response:
+        url = f'{self.base_url}/{path.lstrip("/")}'
+        timeout = self.timeout if timeout is None else timeout
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                r = self.session.post(url, data=body, headers=headers, timeout=timeout)
+            except requests.exceptions.ConnectTimeout:
+                # never reached the server: always safe to retry
+                if last_attempt:
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if last_attempt or not idempotent:
+                    raise
+            else:
+                if r.status_code not in RETRY_STATUSES or last_attempt or not idempotent:
+                    return r
+            time.sleep(self._backoff(attempt))
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def close(self) -> None:
+        self.session.close()
@@ -1,10 +1,39 @@
 import smbus2
+import threading
 
 """
-Needed so that every subsequent file has 
+Needed so that every subsequent file has
 the SAME reference to the bus:
 ie. we don't want overlapping reference to bus 1
 by magnet.py and accelerometer.py
 """
 
-bus = smbus2.SMBus(1)
\ No newline at end of file
+
+class LockedBus:
+    """
+    The bus is shared by threads (main loop: accelerometer, magnet.MagSampler:
+    magnetometer), and smbus2 selects the slave address with a separate ioctl
+    before every transfer, so two threads could interleave and talk to the
+    wrong device. Every call goes through one lock.
+    """
+    def __init__(self, bus):
+        self._bus = bus
+        self.lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._bus, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attr(*args, **kwargs)
+        setattr(self, name, locked) # next lookups skip __getattr__
+        return locked
+
+
+try:
+    bus = LockedBus(smbus2.SMBus(1))
+except OSError:
+    # no I2C adapter (not running on the Pi): replay.py installs a fake_bus.FakeBus instead
+    bus = None
@@ -1,5 +1,10 @@
 import numpy as np
-from filtering import MovingAverage
+from scipy.spatial import cKDTree
+from filtering import MultiMovingAverage
+
+# nearest_points: up to this many point x line pairs, brute force broadcast
+# (KD-tree build + queries are cheaper past ~64 x 64 on the Pi and on x86)
+BROADCAST_MAX_PAIRS = 64 * 64
 
 def distance_pnt2pnt(p1: tuple[float, float, float], p2: tuple[float, float, float]) -> float:
     return np.linalg.norm(np.array(p1) - np.array(p2))
@@ -16,19 +21,29 @@ def closest_point_on_line(point: tuple[float, float, float], line: list[tuple[fl
 
     return closest_point, min_dist
 
+def nearest_points(points, line) -> tuple[np.ndarray, np.ndarray]:
+    """
+    closest_point_on_line for every point at once
+    Returns the closest line point (N x 3) and its distance (N) for each point.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    line = np.asarray(line, dtype=float).reshape(-1, 3)
+    if len(points) == 0 or len(line) == 0:
+        return np.empty((0, 3)), np.empty(0)
+
+    if len(points) * len(line) > BROADCAST_MAX_PAIRS:
+        dists, index = cKDTree(line).query(points)
+        return line[index], dists
+
+    # every point against every line point: at most BROADCAST_MAX_PAIRS x 3 floats (96 KB)
+    diff = points[:, None, :] - line[None, :, :]
+    d2 = np.einsum('ijk,ijk->ij', diff, diff)
+    index = d2.argmin(axis=1)
+    return line[index], np.sqrt(d2[np.arange(len(points)), index])
+
 def average_line(points, num_points=200):
-    avx = MovingAverage(num_points)
-    avy = MovingAverage(num_points)
-    avz = MovingAverage(num_points)
-
-    return [ 
-        (
-            avx.update(points[i][0]),
-            avy.update(points[i][1]),
-            avz.update(points[i][2])
-        )
-        for i in range(len(points))
-     ]
+    # x, y, z smoothed together in one cumulative-sum pass
+    return MultiMovingAverage(num_points, 3).update_many(points)
 
 def zscore(data: list[float]) -> float:
     # chanign to np arrays will allow for multi dimensional arrays
@@ -48,10 +63,7 @@ def get_average_rep(data: list[ list[ list[float, float, float] ] ]) -> list[ li
 def distance_analysis(pos: list[ list[float, float, float] ]):
     av_line = average_line(pos, num_points=100)
 
-    min_dists = []
-    for point in pos:
-        _, dist = closest_point_on_line(point=point, line=av_line)
-        min_dists.append(dist)
+    _, min_dists = nearest_points(pos, av_line)
 
     sd = np.std(min_dists)
     dist_range = np.max(min_dists) - np.min(min_dists)
@@ -68,8 +80,10 @@ def get_pos_scores(pos_reps):
         pos_scores.append(score)
 
     # normalize scores - 0 to 100
-    score_range = np.max(pos_scores) - np.min(pos_scores)
-    pos_scores = [ 100*(score - np.min(pos_scores)) // score_range for score in pos_scores]
+    # (min / max over every point of every rep, reps don't have the same length)
+    lowest = min(np.min(score) for score in pos_scores)
+    score_range = max(np.max(score) for score in pos_scores) - lowest
+    pos_scores = [ 100*(score - lowest) // score_range for score in pos_scores]
 
     return pos_scores
 
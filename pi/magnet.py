@@ -1,6 +1,9 @@
 import smbus2
+import threading
 import time
 
+import numpy as np
+
 # Get I2C bus
 from i2c_bus import bus
 
@@ -8,6 +11,8 @@ from i2c_bus import bus
 MLX90393_ADDR = 0x0C
 CMD_READ = 0x4E
 CMD_SM = 0x3E# Start single meaurement mode (x30), X, Y, Z-Axis enabled (x0E)
+CMD_SB = 0x1E # Start burst mode (x10), X, Y, Z-Axis enabled (x0E): converts continuously
+CMD_EX = 0x80 # Exit mode
 
 def Mag_init():
     #Extra code for adjusting gain and sensitvity
@@ -58,6 +63,121 @@ def Mag_Read() -> tuple[int,int,int]:
 
     return (xMag,yMag,zMag)
 
+def Mag_command(cmd: int) -> int:
+    # command byte, the chip answers with its status byte
+    bus.write_byte(MLX90393_ADDR, cmd)
+    return bus.read_byte(MLX90393_ADDR)
+
+
+class MagSampler:
+    """
+    NOTE:
+    Reads the MLX90393 on its own thread, in burst mode, at rate Hz, so the
+    7 byte I2C read is never on the accelerometer loop's critical path.
+
+    Every read is published with its timestamp into a small ring (size samples)
+    and a latest-value slot; the accelerometer side joins on its own sample
+    times with sample_at(t) / samples_at(times):
+        zero-order hold (default) : last magnetometer sample taken at or before t
+        interpolate=True          : linear between the two samples around t
+    Before the first sample: (0, 0, 0), like the old loop.
+
+    Timestamps come from clock (time.time, like the accelerometer samples).
+    """
+    def __init__(self, rate: float = 50.0, size: int = 64, burst: bool = True,
+                 read=None, clock=time.time):
+        self.period = 1 / rate
+        self.size = size
+        self.burst = burst
+        self.read = Mag_Read if read is None else read
+        self.clock = clock
+
+        self._times = np.zeros(size)
+        self._values = np.zeros((size, 3))
+        self.count = 0 # samples published so far
+        self.latest = (0.0, (0, 0, 0)) # (t, xyz), replaced in one assignment
+        self.errors = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    ## ---- ACQUISITION ---- ##
+
+    def start(self) -> None:
+        if self.burst:
+            Mag_command(CMD_SB)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='mag-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.burst:
+            try:
+                Mag_command(CMD_EX)
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                xyz = self.read()
+            except OSError:
+                self.errors += 1 # bus glitch: keep the last value, try again next period
+            else:
+                self.publish(self.clock(), xyz)
+
+            # absolute deadlines, skip missed ones
+            deadline += self.period
+            now = time.monotonic()
+            if deadline < now:
+                deadline = now
+            self._stop.wait(deadline - now)
+
+    def publish(self, t: float, xyz) -> None:
+        with self._lock:
+            i = self.count % self.size
+            self._times[i] = t
+            self._values[i] = xyz
+            self.count += 1
+        self.latest = (t, xyz)
+
+    ## ---- JOIN ON TIMESTAMP ---- ##
+
+    def _snapshot(self) -> tuple[np.ndarray, np.ndarray, bool]:
+        # ring contents oldest first, and whether older samples were overwritten
+        with self._lock:
+            n = min(self.count, self.size)
+            start = self.count % self.size if self.count > self.size else 0
+            order = (np.arange(n) + start) % self.size
+            return self._times[order], self._values[order], self.count > self.size
+
+    def samples_at(self, times, interpolate: bool = False) -> np.ndarray:
+        # len(times) x 3 magnetometer values at the accelerometer sample times
+        times = np.asarray(times, dtype=float).reshape(-1)
+        t, values, wrapped = self._snapshot()
+        if len(t) == 0:
+            return np.zeros((len(times), 3))
+        if interpolate:
+            # clamped to the first / last sample outside the ring
+            return np.column_stack([np.interp(times, t, values[:, c]) for c in range(3)])
+
+        i = np.searchsorted(t, times, side='right') - 1
+        # older than the ring: the oldest sample we still have (0 before the first one)
+        out = values[np.maximum(i, 0)]
+        if not wrapped:
+            out[i < 0] = 0.0
+        return out
+
+    def sample_at(self, t: float, interpolate: bool = False) -> tuple[float, float, float]:
+        return tuple(self.samples_at([t], interpolate)[0].tolist())
+
+
 # Output data to screen
 if __name__ == "__main__":
     Mag_init()
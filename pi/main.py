@@ -1,15 +1,19 @@
 import numpy as np
+import os
 import time
 import json
-import requests
 
-from filtering import MovingAverage, KalmanFilter3D
 import accelerometer
 import magnet
-from workout import Workout
-from model_preprocessing import process_rep_to_dict, process_rep_to_features, clear_workout_features
+from pipeline import SamplePipeline
+from network import NetworkWorker, WatchUnsupported
+from scheduler import DeadlineScheduler
+from http_client import HttpClient
+from spool import UploadSpool
+from model_preprocessing import clear_workout_features
+from upload_format import encode_features, CONTENT_TYPE as FEATURES_CONTENT_TYPE
 # from rep_analysis import SetData, Exercise, analyse_set, isolate_axis
-from rep_analysis import give_feedback, SetData, separate_reps, workout_feedback, sort_reps
+from rep_analysis import workout_feedback
 
 ## ---- CONSTANTS ---- ##
 workout_states = [
@@ -21,31 +25,65 @@ workout_states = [
 BACKEND_URL = "http://3.10.117.27:80/api"
 USER = "pi"
 
+# one keep-alive session shared by every call below
+client = HttpClient(BACKEND_URL)
+
+# set / workout uploads are committed here first, then flushed in the background
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload_spool.db')
+
+# LIS3DH samples on its own into its FIFO, the loop wakes up every BATCH_PERIOD
+# and filters the whole batch at once (instead of one read every ts)
+ACCEL_FIFO = True
+BATCH_PERIOD = 0.1 # s, 10 samples at 100 Hz (the FIFO holds 32)
+# the magnetometer is read on its own thread (magnet.MagSampler)
+MAG_RATE = 50 # Hz
+# the backend holds /piwait up to this long when nothing changes
+STATE_WAIT = 25 # s
+
 ## ---- UTILS FUNCTIONS ---- ##
 
-def get_workout_state() -> str:
+def get_workout_state() -> tuple[str, str | None]:
+    # state, id of the current set
     PI_ID = USER
-    r = requests.post(f"{BACKEND_URL}/pipoll", json=PI_ID)
+    r = client.post_json('/pipoll', PI_ID)
     j = r.json()
-    return r.text if 'response' not in j.keys() else j['response']
+    return (r.text if 'response' not in j.keys() else j['response']), j.get('set_id')
 
-## MODIFIY
-def send_workout_data(all_sets_data: list[dict], workout_name: str) -> str:
-    json_data = {}
-    json_data['sets_data'] = all_sets_data
-    json_data['pi_id'] = USER
-    json_data['name'] = workout_name
+def wait_workout_state(version) -> tuple[str, str | None, int]:
+    # long poll: the server answers when the state moves past version (or after STATE_WAIT)
+    data = {
+        'pi_id': USER,
+        'version': version,
+        'timeout': STATE_WAIT
+    }
+    r = client.post_json('/piwait', data, timeout=(3.05, STATE_WAIT + 10))
+    if r.status_code == 404:
+        # backend without /piwait: NetworkWorker polls /pipoll from now on
+        raise WatchUnsupported()
+    j = r.json()
+    return j['response'], j.get('set_id'), j['version']
 
-    r = requests.post(url=f"{BACKEND_URL}/process", json=json_data)
-    return r.text
+def post_spooled(endpoint: str, body: bytes, headers: dict[str, str]) -> int:
+    # called by the spool's flusher thread
+    r = client.post(endpoint, body, headers)
+    return r.status_code
 
-def send_set_data(feedback: dict[str, float|str], set_count: int) -> str:
-    json_data = feedback
+## MODIFIY
+def send_workout_data(spool: UploadSpool, all_sets_data: list[dict], workout_name: str,
+                      rep_qualities: list[float] = None) -> str:
+    # float32 matrix + small header (upload_format.py), not the nested JSON
+    # rep_qualities: scored here (rep_scoring.py), the server then only stores them
+    body = encode_features(all_sets_data, workout_name, USER, rep_qualities)
+    body, headers = client.encode(body, FEATURES_CONTENT_TYPE, compress=True)
+    return spool.put('/process', body, headers)
+
+def send_set_data(spool: UploadSpool, feedback: dict[str, float|str], set_count: int) -> str:
+    json_data = dict(feedback)
     json_data['set_count'] = set_count
     json_data['pi_id'] = USER
 
-    r = requests.post(url=f'{BACKEND_URL}/anal', json=json_data)
-    return r.text
+    body, headers = client.encode_json(json_data, compress=True)
+    return spool.put('/anal', body, headers)
 
 
 def send_rep_number(rep_nb) -> str:
@@ -53,7 +91,19 @@ def send_rep_number(rep_nb) -> str:
         'reps': rep_nb ,
         'pi_id': USER
     }
-    r = requests.post(url=f"{BACKEND_URL}/rep", json=data)
+    # not idempotent: a retried rep would be counted twice
+    r = client.post_json('/rep', data, idempotent=False)
+    return r.text
+
+def send_rep_quality(set_id, rep_nb, quality) -> str:
+    # set_id: the server drops the qualities of a set that is already over
+    data = {
+        'rep': rep_nb,
+        'quality': quality,
+        'set_id': set_id,
+        'pi_id': USER
+    }
+    r = client.post_json('/rep_quality', data)
     return r.text
 
 
@@ -63,24 +113,45 @@ def main() -> None:
     ts = 0.01
     M = 50
 
-    accelx_filter = KalmanFilter3D(ts)
-    accely_filter = KalmanFilter3D(ts)
-    accelz_filter = KalmanFilter3D(ts)
+    # filters, set buffer and rep counter
+    pipeline = SamplePipeline(ts, M)
 
-    magnetx_filter = MovingAverage(M)
-    magnety_filter = MovingAverage(M)
-    magnetz_filter = MovingAverage(M)
-
-    accelerometer.lis3dh_init()
+    accelerometer.lis3dh_init(hz=round(1/ts))
     magnet.Mag_init()
-
-    data = SetData([], [], [], [], [], [], ts)
+    # timestamped magnetometer samples, joined on the accelerometer sample times
+    mag_sampler = magnet.MagSampler(rate=MAG_RATE)
+    mag_sampler.start()
+    if ACCEL_FIFO:
+        accelerometer.lis3dh_fifo_enable()
+
+    # live HTTP calls happen on this thread, the loop only reads network.state
+    # (pushed by the backend through the /piwait long poll)
+    network = NetworkWorker(poll=get_workout_state,
+                            watch=wait_workout_state,
+                            handlers={
+                                'rep': send_rep_number,
+                                'quality': send_rep_quality
+                            },
+                            initial_state=workout_states[-1],
+                            poll_interval=50*ts)
+    network.start()
+
+    def start_set(workout_name: str) -> None:
+        # rep quality scored on the Pi as each rep closes (pipeline worker thread), tagged
+        # with the set's id: end_set waits for every rep, the callback is only replaced after
+        set_id = network.set_id
+        pipeline.on_rep_scored = lambda rep_nb, quality: network.submit('quality', set_id, rep_nb, quality)
+        pipeline.start_set(workout_name)
+
+    # set / workout results survive the backend (or the Wi-Fi) being down
+    spool = UploadSpool(SPOOL_PATH, send=post_spooled)
+    spool.start()
 
     current_workout_state = workout_states[-1]
     previous_workout_state = workout_states[-1]
-    current_workout = Workout("Rows")
     set_count: int = 0
     current_workout_feedbacks: list[ dict[str, float] ] = []
+    workout_qualities: list[ float ] = []
     workout_features = {
         'accel_x': {},
         'accel_y': {},
@@ -101,177 +172,114 @@ def main() -> None:
     g = 9.81
 
     print('All ready! Sampling now...')
+    # absolute deadlines every ts (or BATCH_PERIOD): read/filter time doesn't stretch the period
+    scheduler = DeadlineScheduler(BATCH_PERIOD if ACCEL_FIFO else ts, policy='skip')
     i = 0
     # try:
     while True:
         i += 1
-        time.sleep(ts)
+        scheduler.wait()
 
         # Get workout State
         previous_workout_state = current_workout_state
-        if (i % 50) == 0:
-            # previous_workout_state = current_workout_state
-            current_workout_state = get_workout_state()
-            print(f'Polled State: {current_workout_state} {i}')
+        current_workout_state = network.state # latest polled value, never blocks
+        if current_workout_state != previous_workout_state:
+            print(f'Polled State: {current_workout_state} {i} {network.stats()}')
 
         # # Timeout check
         # if time.time() - init_time > 300: # 5 min workout timeout
         #     current_workout_state = workout_states[-1]
-        #     data = SetData([], [], [], [], [], [], ts)
+        #     pipeline.reset()
 
         # STATE MACHINE
         match current_workout_state:
             case 'Seated Cable Rows':
                 if previous_workout_state != current_workout_state:
                     print('Starting Seated Cable Rows...')
-                    current_workout = Workout('Seated Cable Rows')
-                    accelx_filter.clear()
-                    accely_filter.clear()
-                    accelz_filter.clear()
-                    magnetx_filter.clear()
-                    magnety_filter.clear()
-                    magnetz_filter.clear()
-                    data = SetData([], [], [], [], [], [], ts)
+                    start_set('Seated Cable Rows')
+                    if ACCEL_FIFO:
+                        accelerometer.lis3dh_fifo_clear() # drop what piled up while idle
 
             case "Lat Pulldowns":
                 if previous_workout_state != current_workout_state:
                     print('Starting Lat Pulldowns...')
-                    current_workout = Workout("Tricep Extensions")
-                    accelx_filter.clear()
-                    accely_filter.clear()
-                    accelz_filter.clear()
-                    magnetx_filter.clear()
-                    magnety_filter.clear()
-                    magnetz_filter.clear()
-                    data = SetData([], [], [], [], [], [], ts)
+                    start_set('Lat Pulldowns')
+                    if ACCEL_FIFO:
+                        accelerometer.lis3dh_fifo_clear()
 
             case "Idle":
                 if previous_workout_state == current_workout_state:
                     continue
                 if previous_workout_state != 'Pseudo Idle':
+                    scheduler.dump() # timing of the set that just ended
+                    scheduler.reset_stats()
                     # package last set
-                    # Sort Reps
-                    accel_reps, vel_reps, pos_reps, mag_reps, data = separate_reps(data, current_workout.select)
-                    # DATA.REP_INDICES ARE NOW UPDATED!! 
-                    num_reps = len(accel_reps)
-                    print(f'num_reps: {num_reps}')
-
-                    feedback = give_feedback(accel_reps, vel_reps, pos_reps, mag_reps, 
-                                            data.sample_times, data.rep_indices)
-                    print(f'feedback calculated: {feedback}')
+                    feedback = pipeline.end_set(workout_features)
                     current_workout_feedbacks.append(feedback)
+                    workout_qualities += pipeline.rep_qualities
 
-                    send_set_data(feedback, set_count)
-
-                    for i in range(num_reps):
-                        process_rep_to_features(accel_reps[i], vel_reps[i], pos_reps[i],
-                                                mag_reps[i], workout_features)
+                    send_set_data(spool, feedback, set_count)
                 
                 # Send WORKOUT DATA (multiple sets)
                 # overall_feedback = workout_feedback(current_workout_feedbacks)
                 print(f'features per rep shape: {np.shape(workout_features)}')
                 print(workout_features)
-                response = send_workout_data(workout_features, current_workout.workout)
-                print(response)
+                send_workout_data(spool, workout_features, pipeline.workout.workout, workout_qualities)
                 # break # REMOVE IN PRODUCTION!!
                 workout_features = clear_workout_features(workout_features)
                 print(f'cleared_workout_features: {workout_features}')
                 set_count = 0
                 current_workout_feedbacks.clear()
-                accelx_filter.clear()
-                accely_filter.clear()
-                accelz_filter.clear()
-                magnetx_filter.clear()
-                magnety_filter.clear()
-                magnetz_filter.clear()
-                data = SetData([], [], [], [], [], [], ts)
+                workout_qualities.clear()
+                pipeline.reset()
 
             case "Pseudo Idle":
                 if previous_workout_state == current_workout_state or previous_workout_state == 'Idle':
                     continue
-                # Sort Reps
-                accel_reps, vel_reps, pos_reps, mag_reps, data = separate_reps(data, current_workout.select)
-                # DATA.REP_INDICES ARE NOW UPDATED!! 
-                num_reps = len(accel_reps)
-                print(f'num_reps: {num_reps}')
-
-                feedback = give_feedback(accel_reps, vel_reps, pos_reps, mag_reps, 
-                                         data.sample_times, data.rep_indices)
-                print(f'feedback calculated: {feedback}')
+                scheduler.dump() # timing of the set that just ended
+                scheduler.reset_stats()
+                print(f'workout_features before added: {workout_features}')
+                feedback = pipeline.end_set(workout_features)
                 current_workout_feedbacks.append(feedback)
+                workout_qualities += pipeline.rep_qualities
 
                 print(f'feedback: {feedback}')
 
                 set_count += 1
-                send_set_data(feedback, set_count)
+                send_set_data(spool, feedback, set_count)
 
-                print(f'workout_features before added: {workout_features}')
-                for i in range(num_reps):
-                    process_rep_to_features(accel_reps[i], vel_reps[i], pos_reps[i],
-                                            mag_reps[i], workout_features)
-                    
                 print(f'workout_features: {workout_features}')
 
-                accelx_filter.clear()
-                accely_filter.clear()
-                accelz_filter.clear()
-                magnetx_filter.clear()
-                magnety_filter.clear()
-                magnetz_filter.clear()
-                data = SetData([], [], [], [], [], [], ts)
+                pipeline.reset()
                 # Send SET data
                 continue
 
             case _:
                 set_count = 0
-                accelx_filter.clear()
-                accely_filter.clear()
-                accelz_filter.clear()
-                magnetx_filter.clear()
-                magnety_filter.clear()
-                magnetz_filter.clear()
-                data = SetData([], [], [], [], [], [], ts)
+                pipeline.reset()
                 continue
 
         if current_workout_state in ["Idle", "Pseudo Idle"]:
             # time.sleep(ts)
             continue
 
-        accelx, accely, accelz = accelerometer.lis3dh_read_xyz()
-        # print(accelx, accely, accelz)
-        if i % 2 == 0: # 50 Hz for ts = 0.01 / fs = 100Hz
-            magx, magy, magz = magnet.Mag_Read()
-
-        accelx_filter.step(accelx)
-        accely_filter.step(accely)
-        accelz_filter.step(accelz)
-
-        data.accel.append((accelx_filter.acceleration, 
-                            accely_filter.acceleration,
-                            accelz_filter.acceleration))
-        
-        data.vel.append((accelx_filter.velocity, 
-                            accely_filter.velocity,
-                            accelz_filter.velocity))
-        
-        data.pos.append((accelx_filter.position, 
-                            accely_filter.position,
-                            accelz_filter.position)) 
-                        
-        data.magn.append((
-            magnetx_filter.update(magx),
-            magnety_filter.update(magy),
-            magnetz_filter.update(magz)
-        ))
-
-        data.sample_times.append(time.time())
-
-        counted, rep_nb = current_workout.update([accelx_filter.velocity, accely_filter.velocity, accelz_filter.velocity],
-                            [magnetx_filter.output, magnety_filter.output, magnetz_filter.output])
-        
+        if ACCEL_FIFO:
+            times, accel = accelerometer.lis3dh_fifo_read()
+            mag = mag_sampler.samples_at(times)
+            for rep_nb in pipeline.process_batch(accel, mag, times):
+                network.submit('rep', rep_nb)
+                print(f'Rep {rep_nb} counted!')
+            continue
+
+        accel = accelerometer.lis3dh_read_xyz()
+        # print(accel)
+        now = time.time()
+        mag = mag_sampler.sample_at(now)
+
+        counted, rep_nb = pipeline.process(accel, mag, now)
+
         if counted:
-            send_rep_number(rep_nb)
-            data.rep_indices.append(len(data.sample_times)-1)
+            network.submit('rep', rep_nb)
             print(f'Rep {rep_nb} counted!')
 
     # except (KeyboardInterrupt, Exception) as e:
@@ -3,8 +3,12 @@ import json
 from scipy.stats import skew, kurtosis
 from rep_analysis import SetData
 from math import isnan
+from feature_schema import CHANNELS, STATS, FEATURE_COLUMNS
 
 def line_to_axes(line: list[ list[float, float, float] ]) -> tuple[ list[float], list[float], list[float] ]:
+    if isinstance(line, np.ndarray):
+        # N x 3 block (eg. a SetBuffer rep slice): column views, no copies
+        return line[:, 0], line[:, 1], line[:, 2]
     x = [line[i][0] for i in range(len(line))]
     y = [line[i][1] for i in range(len(line))]
     z = [line[i][2] for i in range(len(line))]
@@ -23,6 +27,115 @@ def extract_features(sig: list[float]) -> dict[str, float]:
         'kurtosis': kurtosis(sig, fisher=True, bias=False)
     }
 
+## ---- VECTORIZED FEATURES ---- ##
+
+def rep_matrix(accel3d, vel3d, pos3d, mag3d) -> np.ndarray:
+    # one rep (or set) as a samples x 12 matrix, columns in CHANNELS order
+    return np.hstack([np.asarray(sig, dtype=float).reshape(-1, 3) for sig in (accel3d, vel3d, pos3d, mag3d)])
+
+
+def _percentile_sorted(srt: np.ndarray, starts: np.ndarray, n: np.ndarray, q: float) -> np.ndarray:
+    """
+    np.percentile(..., method='linear') of every segment of an already sorted
+    samples x channels matrix, same virtual index and lerp as numpy
+    """
+    # numpy's default 'linear' method: virtual index (n - 1) * q
+    virtual = (n - 1) * q
+    previous = np.floor(virtual)
+    gamma = (virtual - previous)[:, None]
+    previous = np.clip(previous.astype(np.int64), 0, n - 1)
+    following = np.minimum(previous + 1, n - 1)
+
+    a = srt[starts + previous]
+    b = srt[starts + following]
+    diff = b - a
+    out = a + diff * gamma
+    return np.where(gamma >= 0.5, b - diff * (1 - gamma), out)
+
+
+def extract_feature_matrix(samples, offsets=None, nan_to_zero: bool = True) -> tuple[np.ndarray, list[str]]:
+    """
+    Every STATS feature of every channel, for one rep or a whole set of ragged reps
+
+    samples : N x 12 (rep_matrix), reps stacked one after the other
+    offsets : rep boundaries, [0, end_rep_0, end_rep_1, ..., N] (None: one rep)
+
+    Returns a reps x 96 matrix (FEATURE_COLUMNS order) and the column names.
+    Same values as update_features: population std, linear percentiles, bias-corrected
+    skew / Fisher kurtosis with scipy's degenerate-case rules, NaN -> 0.
+    Empty reps give NaN (0 with nan_to_zero).
+
+    One segmented sort serves median, min, max and IQR; the central moments are
+    shared by std, skew and kurtosis.
+    """
+    X = np.asarray(samples, dtype=float).reshape(-1, len(CHANNELS))
+    N = len(X)
+    offsets = np.array([0, N] if offsets is None else offsets, dtype=np.int64)
+    starts = offsets[:-1]
+    n = np.diff(offsets)
+    R = len(n)
+    empty = n == 0
+    n_safe = np.maximum(n, 1)
+    starts_safe = np.minimum(starts, max(N - 1, 0))
+
+    if N == 0:
+        out = np.full((R, len(FEATURE_COLUMNS)), np.nan)
+        return (np.nan_to_num(out, nan=0.0) if nan_to_zero else out), FEATURE_COLUMNS
+
+    seg = np.repeat(np.arange(R), n)
+    nf = n_safe[:, None].astype(float)
+
+    # mean, central moments
+    mean = np.add.reduceat(X, starts_safe, axis=0) / nf
+    d = X - mean[seg]
+    d2 = d * d
+    m2 = np.add.reduceat(d2, starts_safe, axis=0) / nf
+    m3 = np.add.reduceat(d2 * d, starts_safe, axis=0) / nf
+    m4 = np.add.reduceat(d2 * d2, starts_safe, axis=0) / nf
+    std = np.sqrt(m2)
+
+    # segmented sort: sort every column, then stable-sort by rep
+    order = np.argsort(X, axis=0, kind='stable')
+    order = np.take_along_axis(order, np.argsort(seg[order], axis=0, kind='stable'), axis=0)
+    srt = np.take_along_axis(X, order, axis=0)
+
+    last = starts_safe + n_safe - 1
+    minimum = srt[starts_safe]
+    maximum = srt[last]
+    median = np.where((n % 2 == 1)[:, None],
+                      srt[starts_safe + n_safe // 2],
+                      (srt[starts_safe + np.maximum(n_safe // 2 - 1, 0)] + srt[starts_safe + n_safe // 2]) / 2)
+    iqr = _percentile_sorted(srt, starts_safe, n_safe, 0.75) - _percentile_sorted(srt, starts_safe, n_safe, 0.25)
+
+    # skew / kurtosis: scipy.stats rules (bias=False, fisher=True)
+    with np.errstate(all='ignore'):
+        zero = m2 <= (np.finfo(float).eps * mean) ** 2
+        skewness = np.where(zero, np.nan, m3 / m2 ** 1.5)
+        corrected = np.sqrt((nf - 1.0) * nf) / (nf - 2.0) * m3 / m2 ** 1.5
+        skewness = np.where(~zero & (nf > 2), corrected, skewness)
+
+        kurt = np.where(zero, np.nan, m4 / m2 ** 2.0)
+        corrected = 1.0 / (nf - 2) / (nf - 3) * ((nf ** 2 - 1.0) * m4 / m2 ** 2.0 - 3 * (nf - 1) ** 2.0) + 3.0
+        kurt = np.where(~zero & (nf > 3), corrected, kurt) - 3
+
+    # reps x channels x stats -> reps x 96, channel-major
+    out = np.stack([mean, std, median, minimum, maximum, iqr, skewness, kurt], axis=2).reshape(R, -1)
+    out[empty] = np.nan
+    if nan_to_zero:
+        out = np.nan_to_num(out, nan=0.0, posinf=np.inf, neginf=-np.inf)
+    return out, FEATURE_COLUMNS
+
+
+def append_feature_rows(rows: np.ndarray, all_features: dict) -> dict:
+    # reps x 96 rows into the nested {channel: {stat: [per rep]}} upload format
+    rows = np.asarray(rows).reshape(-1, len(FEATURE_COLUMNS))
+    for c, channel in enumerate(CHANNELS):
+        features = all_features.setdefault(channel, {})
+        for s, stat in enumerate(STATS):
+            features.setdefault(stat, []).extend(rows[:, c*len(STATS) + s])
+    return all_features
+
+
 def replace_nan_dict_vals(x: dict, val):
     for key in x:
         if isnan(x[key]):
@@ -32,62 +145,23 @@ def replace_nan_dict_vals(x: dict, val):
 
 
 def process_rep_to_dict(accel3d, vel3d, pos3d, mag3d):
-    accel = line_to_axes(accel3d)
-    vel = line_to_axes(vel3d)
-    pos = line_to_axes(pos3d)
-    mag = line_to_axes(mag3d)
+    row, _ = extract_feature_matrix(rep_matrix(accel3d, vel3d, pos3d, mag3d), nan_to_zero=False)
+    row = row[0]
+
+    data = {}
+    for c, channel in enumerate(CHANNELS):
+        data[channel] = dict(zip(STATS, row[c*len(STATS) : (c+1)*len(STATS)]))
 
     # magnetometer is known to be fussy
     # check for constant stream ie. for nans in output
-
-    magx_features = extract_features(mag[0])
-    magx_features = replace_nan_dict_vals(magx_features, 0)
-    magy_features = extract_features(mag[1])
-    magy_features = replace_nan_dict_vals(magy_features, 0)
-    magz_features = extract_features(mag[2])
-    magz_features = replace_nan_dict_vals(magz_features, 0)
-    
-
-    data = {
-        'accel_x': extract_features(accel[0]),
-        'accel_y': extract_features(accel[1]),
-        'accel_z': extract_features(accel[2]),
-        'vel_x': extract_features(vel[0]),
-        'vel_y': extract_features(vel[1]),
-        'vel_z': extract_features(vel[2]),
-        'pos_x': extract_features(pos[0]),
-        'pos_y': extract_features(pos[1]),
-        'pos_z': extract_features(pos[2]),
-        'mag_x': magx_features,
-        'mag_y': magy_features,
-        'mag_z': magz_features
-    }
+    for channel in ('mag_x', 'mag_y', 'mag_z'):
+        data[channel] = replace_nan_dict_vals(data[channel], 0)
 
     return data
 
 def process_rep_to_features(accel3d, vel3d, pos3d, mag3d, all_features):
-    accel = line_to_axes(accel3d)
-    vel = line_to_axes(vel3d)
-    pos = line_to_axes(pos3d)
-    mag = line_to_axes(mag3d)
-
-    all_features['accel_x'] = update_features(accel[0], all_features['accel_x'])
-    all_features['accel_y'] = update_features(accel[1], all_features['accel_y'])
-    all_features['accel_z'] = update_features(accel[2], all_features['accel_z'])
-    
-    all_features['vel_x'] = update_features(vel[0], all_features['vel_x'])
-    all_features['vel_y'] = update_features(vel[1], all_features['vel_y'])
-    all_features['vel_z'] = update_features(vel[2], all_features['vel_z'])
-
-    all_features['pos_x'] = update_features(pos[0], all_features['pos_x'])
-    all_features['pos_y'] = update_features(pos[1], all_features['pos_y'])
-    all_features['pos_z'] = update_features(pos[2], all_features['pos_z'])
-
-    all_features['mag_x'] = update_features(mag[0], all_features['mag_x'])
-    all_features['mag_y'] = update_features(mag[1], all_features['mag_y'])
-    all_features['mag_z'] = update_features(mag[2], all_features['mag_z'])
-    
-    return all_features
+    rows, _ = extract_feature_matrix(rep_matrix(accel3d, vel3d, pos3d, mag3d))
+    return append_feature_rows(rows, all_features)
 
 
 def update_features(sig: list[float], features: dict[str, list[float]]) -> dict[str, list[float]]:
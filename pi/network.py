@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+
+"""
+NOTE:
+All HTTP traffic of the Pi runs on this worker thread, never on the sampling loop.
+
+    sampling loop --submit('rep', 3)--> [bounded queue] --> worker --> handlers['rep'](3)
+    sampling loop <--- network.state --- worker <-- poll() every poll_interval
+
+The polled state is published as a plain attribute: a single assignment
+is atomic under the GIL, so the loop reads the latest value without locking.
+If the queue is full the event is dropped (and counted) instead of
+blocking the loop.
+
+poll() returns the state and the server's id of the current set (None if the
+server has none), published as network.set_id before network.state: when the
+loop sees a new set start, set_id is already the new set's, to tag its events.
+
+With watch (long polling: the server holds the request until the state
+changes), the state is followed on a second thread instead of polling:
+
+    state thread: watch(version) --held by the server--> (state, set_id, new version) -> network.state
+
+so a state change reaches the loop within one round trip, and an idle Pi
+sends one request per server hold time (~25 s). watch raising WatchUnsupported
+(a server without long polling) ends the state thread for good, and the
+worker polls every poll_interval instead, one request per poll.
+"""
+
+
+class WatchUnsupported(Exception):
+    # raised by watch(): the server has no long polling, poll() from now on
+    pass
+
+
+class NetworkWorker:
+    state: str
+    sent: int
+    dropped: int
+    errors: int
+
+    def __init__(self, poll, handlers: dict, initial_state: str = 'Idle',
+                 poll_interval: float = 0.5, maxsize: int = 64, watch=None):
+        self.poll = poll
+        self.watch = watch
+        self.handlers = handlers
+        self.poll_interval = poll_interval
+        self.events = queue.Queue(maxsize=maxsize)
+
+        self.state = initial_state
+        self.set_id = None
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self.state_version = None
+        self.state_changes = 0
+        self.polling = watch is None
+
+        self._running = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='network', daemon=True)
+        # blocks in watch() for up to the server's hold time: never joined
+        self._state_thread = threading.Thread(target=self._watch, name='network-state', daemon=True)
+
+    def start(self) -> None:
+        self._running.set()
+        self._thread.start()
+        if self.watch is not None:
+            self._state_thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        # flushes what is already queued, then exits
+        self._running.clear()
+        self._thread.join(timeout)
+
+    def submit(self, kind: str, *args) -> bool:
+        if kind not in self.handlers:
+            raise KeyError(f'No handler for event {kind!r}')
+        try:
+            self.events.put_nowait((kind, args))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    @property
+    def queue_depth(self) -> int:
+        return self.events.qsize()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'queue_depth': self.queue_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'state_changes': self.state_changes,
+            'polling': self.polling,
+        }
+
+    def _handle(self, kind: str, args: tuple) -> None:
+        try:
+            self.handlers[kind](*args)
+            self.sent += 1
+        except Exception as e:
+            self.errors += 1
+            print(f'Network error on {kind}: {e}')
+
+    def _poll(self) -> None:
+        try:
+            state, set_id = self.poll()
+            if state != self.state:
+                self.state_changes += 1
+            self.set_id = set_id
+            self.state = state
+        except Exception as e:
+            self.errors += 1
+            print(f'Network error on poll: {e}')
+
+    def _run(self) -> None:
+        next_poll = time.monotonic()
+        while self._running.is_set() or not self.events.empty():
+            polling = self.polling # turned on by the state thread if the server can't be watched
+            timeout = max(0.0, next_poll - time.monotonic()) if polling else self.poll_interval
+            try:
+                kind, args = self.events.get(timeout=timeout)
+                self._handle(kind, args)
+            except queue.Empty:
+                pass
+
+            if polling and self._running.is_set() and time.monotonic() >= next_poll:
+                self._poll()
+                next_poll = time.monotonic() + self.poll_interval
+
+    def _watch(self) -> None:
+        while self._running.is_set():
+            try:
+                state, set_id, version = self.watch(self.state_version)
+            except WatchUnsupported:
+                print('Server has no long polling, polling the state instead')
+                self.polling = True
+                return
+            except Exception as e:
+                self.errors += 1
+                print(f'Network error on watch: {e}')
+                time.sleep(self.poll_interval) # server down: don't spin
+                continue
+
+            if state != self.state:
+                self.state_changes += 1
+            self.set_id = set_id
+            self.state = state
+            self.state_version = version
@@ -0,0 +1,222 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from filtering import MovingAverage, KalmanFilter3D, KalmanFilterBank
+from workout import Workout
+from model_preprocessing import extract_feature_matrix, rep_matrix, append_feature_rows
+from rep_analysis import feedback_from_ranges, no_reps_feedback, SetBuffer, OnlineRepSegmenter, pos_range, jerk_range
+from rep_scoring import load_scorer
+
+"""
+NOTE:
+The signal processing main.py runs on every sample and at the end of every set,
+with no sensor or network access, so replay.py can drive exactly the same code
+from recordings, as fast as the CPU allows.
+
+    pipeline.start_set('Seated Cable Rows')
+    counted, rep_nb = pipeline.process(accel_xyz, mag_xyz, t)   # every sample
+    rep_nbs = pipeline.process_batch(accel_k3, mag_xyz, t_k)     # or a FIFO batch
+    feedback = pipeline.end_set(workout_features)                # set end
+
+Rep boundaries are refined during the set (OnlineRepSegmenter), and every rep
+is scored in a background thread as soon as its closing boundary is known
+(model features, position range, jerk range: rep_terms, and its quality with
+the exercise's model if the Pi has one: rep_scoring.py).
+Set end only segments and scores the last rep or two, then aggregates.
+
+    pipeline.on_rep_scored = lambda rep_number, quality: ...   # worker thread
+    pipeline.rep_qualities                                      # after end_set
+"""
+
+
+def rep_terms(accel, vel, pos, mag) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # everything end_set needs from one rep: 96 model features, pos range, jerk range
+    features, _ = extract_feature_matrix(rep_matrix(accel, vel, pos, mag))
+    return features[0], pos_range(pos), jerk_range(accel)
+
+
+
+class SamplePipeline:
+    ts: float
+    data: SetBuffer
+    workout: Workout
+    segmenter: OnlineRepSegmenter
+
+    def __init__(self, ts: float, M: int = 50):
+        self.ts = ts
+        # fixed precomputed gain (dt never changes). One sample: three scalar filters on
+        # python floats (a 3 channel bank step is mostly numpy call overhead), a FIFO
+        # batch: x, y, z in one bank step_many. Both hold the same state, handed over
+        # when the path changes.
+        self.accel_filters = tuple(KalmanFilter3D(ts, steady_state=True) for _ in range(3))
+        self.accel_bank = KalmanFilterBank(ts, 3, steady_state=True)
+        self.bank_current = True # accel_bank.state is the latest state
+        self.magnet_filters = (MovingAverage(M), MovingAverage(M), MovingAverage(M))
+        self.data = SetBuffer(ts)
+        self.workout = Workout('Rows')
+        self.segmenter = OnlineRepSegmenter(self.workout.select[0], M)
+        # one worker: reps are scored in order, off the sampling loop
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.rep_futures = []
+        self.last_boundary = None
+        self.scorer = None
+        self.on_rep_scored = None
+        self.rep_qualities = [] # one per rep of the last set, empty without a model
+
+    def reset(self) -> None:
+        # the worker reads rep views of the buffer that is about to be reused
+        wait(self.rep_futures)
+        self.rep_futures = []
+        self.last_boundary = None
+        for accel_filter in self.accel_filters:
+            accel_filter.clear()
+        self.accel_bank.reset()
+        self.bank_current = True
+        for magnet_filter in self.magnet_filters:
+            magnet_filter.clear()
+        self.data.clear()
+        self.segmenter.clear(self.workout.select[0])
+
+    def start_set(self, workout_name: str, t: float = None) -> None:
+        # t: start time on the same clock as the sample timestamps (default time.time())
+        self.workout = Workout(workout_name, init_time=t)
+        self.reset()
+        self.scorer = load_scorer(workout_name)
+
+    def _scalar_state(self) -> None:
+        # batch -> sample path: the scalar filters continue from the bank's state
+        for accel_filter, (p, v, a) in zip(self.accel_filters, self.accel_bank.state.tolist()):
+            accel_filter.position, accel_filter.velocity, accel_filter.acceleration = p, v, a
+            accel_filter.current_state = (p, v, a)
+        self.bank_current = False
+
+    def _bank_state(self) -> None:
+        # sample -> batch path
+        self.accel_bank.state[:] = [(f.position, f.velocity, f.acceleration) for f in self.accel_filters]
+        self.bank_current = True
+
+    def process(self, accel, mag, t: float) -> tuple[bool, int | None]:
+        if self.bank_current:
+            self._scalar_state()
+        fx, fy, fz = self.accel_filters
+        fx.step(accel[0])
+        fy.step(accel[1])
+        fz.step(accel[2])
+        acceleration = (fx.acceleration, fy.acceleration, fz.acceleration)
+        velocity = (fx.velocity, fy.velocity, fz.velocity)
+        position = (fx.position, fy.position, fz.position)
+
+        magx_filter, magy_filter, magz_filter = self.magnet_filters
+        mag_smoothed = (magx_filter.update(mag[0]),
+                        magy_filter.update(mag[1]),
+                        magz_filter.update(mag[2]))
+
+        self.data.append(acceleration, velocity, position, mag_smoothed, t)
+
+        self.segmenter.update(velocity[self.segmenter.axis])
+
+        counted, rep_nb = self.workout.update(velocity, mag_smoothed, now=t)
+        if counted:
+            self.data.mark_rep()
+            boundary = self.segmenter.mark_rep()
+            if boundary is not None:
+                self._close_rep(boundary)
+        return counted, rep_nb
+
+    def process_batch(self, accel, mag, t) -> list[int]:
+        """
+        A batch of accelerometer samples (eg. an accelerometer FIFO drain) at once:
+            accel : k x 3, t : k timestamps
+            mag   : k x 3, or one x, y, z held for the whole batch
+        Same result as process() on every sample, the filters run vectorized.
+        Returns the rep numbers counted in the batch.
+        """
+        accel = np.asarray(accel, dtype=float).reshape(-1, 3)
+        t = np.asarray(t, dtype=float).reshape(-1)
+        k = len(t)
+        if k == 0:
+            return []
+
+        if not self.bank_current:
+            self._bank_state()
+        states = self.accel_bank.step_many(accel) # k x 3 channels x [pos, vel, accel]
+        vel = states[:, :, 1]
+        mag = np.broadcast_to(np.asarray(mag, dtype=float), (k, 3))
+        mag_smoothed = np.column_stack([f.update_many(mag[:, c]) for c, f in enumerate(self.magnet_filters)])
+
+        start = len(self.data)
+        self.data.extend(states[:, :, 2], vel, states[:, :, 0], mag_smoothed, t)
+        self.segmenter.extend(vel[:, self.segmenter.axis])
+
+        # the rep counter is a small per-sample state machine (on python floats, much
+        # cheaper to index than numpy rows)
+        counted_reps = []
+        update = self.workout.update
+        for i, (v, m, now) in enumerate(zip(vel.tolist(), mag_smoothed.tolist(), t.tolist())):
+            counted, rep_nb = update(v, m, now=now)
+            if counted:
+                self.data.mark_rep(start + i)
+                boundary = self.segmenter.mark_rep(start + i)
+                if boundary is not None:
+                    self._close_rep(boundary)
+                counted_reps.append(rep_nb)
+        return counted_reps
+
+    def _rep_views(self, start: int, stop: int = None) -> tuple:
+        data = self.data
+        return data.accel[start:stop], data.vel[start:stop], data.pos[start:stop], data.magn[start:stop]
+
+    def _score_rep(self, scorer, rep_number: int, *views) -> tuple:
+        # rep_terms + quality (None without a model)
+        features, rep_pos_range, rep_jerk_range = rep_terms(*views)
+        quality = None
+        if scorer is not None:
+            quality = scorer.score(features)
+            if self.on_rep_scored is not None:
+                self.on_rep_scored(rep_number, quality)
+        return features, rep_pos_range, rep_jerk_range, quality
+
+    def _close_rep(self, boundary: int) -> None:
+        # the rep [last boundary, boundary) is final: score it in the background
+        if self.last_boundary is not None:
+            views = self._rep_views(self.last_boundary, boundary)
+            rep_number = len(self.rep_futures) + 1
+            self.rep_futures.append(self.executor.submit(self._score_rep, self.scorer, rep_number, *views))
+        self.last_boundary = boundary
+
+    def end_set(self, workout_features: dict) -> dict[str, float | str]:
+        """
+        Close the last reps, aggregate the per-rep terms into the set feedback,
+        append every rep's features to workout_features, returns the set feedback
+        """
+        boundaries = self.segmenter.finish()
+        self.data.rep_indices = boundaries
+        # DATA.REP_INDICES ARE NOW UPDATED!!
+        num_reps = len(boundaries)
+        print(f'num_reps: {num_reps}')
+        if num_reps == 0:
+            # no samples: the set ended before the first FIFO drain (quick start / stop)
+            self.rep_futures = []
+            self.rep_qualities = []
+            return no_reps_feedback()
+
+        # reps not closed during the set: the one(s) around the final boundary
+        done = len(self.rep_futures)
+        remaining = [*boundaries[done:], None]
+        rows = [future.result() for future in self.rep_futures]
+        rows += [self._score_rep(self.scorer, done + i + 1, *self._rep_views(remaining[i], remaining[i+1]))
+                 for i in range(len(remaining) - 1)]
+        self.rep_futures = []
+        self.rep_qualities = [row[3] for row in rows] if self.scorer is not None else []
+
+        features = np.array([row[0] for row in rows])
+        feedback = feedback_from_ranges([row[1] for row in rows], [row[2] for row in rows],
+                                        self.data.sample_times, self.data.rep_indices)
+        print(f'feedback calculated: {feedback}')
+
+        append_feature_rows(features, workout_features)
+        return feedback
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
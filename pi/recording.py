@@ -0,0 +1,115 @@
+import struct
+import sys
+import time
+
+import numpy as np
+
+"""
+NOTE:
+Compact binary recordings of the raw sensor stream, for replay.py.
+
+File layout (little-endian):
+    header : b'PTREC' + u8 version + u16 reserved                  (8 bytes)
+    record : u8 kind | i8 t_ns (time.monotonic_ns) | 3 x f32 xyz    (21 bytes)
+
+    kind ACCEL : lis3dh_read_xyz() output, in g
+    kind MAG   : Mag_Read() output, raw counts
+
+Both fit float32 exactly (the accelerometer values are multiples of 2^-14 g).
+"""
+
+MAGIC = b'PTREC'
+VERSION = 1
+HEADER = struct.Struct('<5sBH')
+RECORD = struct.Struct('<Bq3f')
+
+ACCEL = 0
+MAG = 1
+
+RECORD_DTYPE = np.dtype([('kind', '<u1'), ('t_ns', '<i8'), ('xyz', '<f4', (3,))])
+
+
+class Recorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0))
+        self.count = 0
+
+    def write(self, kind: int, xyz, t_ns: int = None) -> None:
+        t_ns = time.monotonic_ns() if t_ns is None else t_ns
+        self.file.write(RECORD.pack(kind, t_ns, *xyz))
+        self.count += 1
+
+    def accel(self, xyz, t_ns: int = None) -> None:
+        self.write(ACCEL, xyz, t_ns)
+
+    def mag(self, xyz, t_ns: int = None) -> None:
+        self.write(MAG, xyz, t_ns)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_recording(path: str) -> np.ndarray:
+    """
+    Whole file as one structured array: rec['kind'], rec['t_ns'], rec['xyz'] (N x 3)
+    """
+    with open(path, 'rb') as file:
+        magic, version, _ = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not a version {VERSION} sensor recording')
+    return np.fromfile(path, dtype=RECORD_DTYPE, offset=HEADER.size)
+
+
+def convert_csv(csv_path: str, out_path: str) -> int:
+    """
+    Old captures (eg. 50_points.csv: time | accel xyz | vel xyz | pos xyz)
+    to a recording with only the accelerometer stream
+    """
+    data = np.loadtxt(csv_path, delimiter=',', ndmin=2)
+    with Recorder(out_path) as recorder:
+        for row in data:
+            recorder.accel(row[1:4], int(row[0] * 1e9))
+        return recorder.count
+
+
+def record(path: str, duration: float, ts: float = 0.01) -> int:
+    # same read pattern as main.py: accelerometer every ts, magnetometer every other sample
+    import accelerometer
+    import magnet
+    from scheduler import DeadlineScheduler
+
+    accelerometer.lis3dh_init()
+    magnet.Mag_init()
+    scheduler = DeadlineScheduler(ts)
+    end = time.monotonic() + duration
+    i = 0
+    with Recorder(path) as recorder:
+        try:
+            while time.monotonic() < end:
+                scheduler.wait()
+                recorder.accel(accelerometer.lis3dh_read_xyz())
+                if i % 2 == 0:
+                    recorder.mag(magnet.Mag_Read())
+                i += 1
+        except KeyboardInterrupt:
+            pass
+        scheduler.dump()
+        return recorder.count
+
+
+if __name__ == '__main__':
+    # python recording.py out.rec [seconds]
+    # python recording.py --csv 50_points.csv out.rec
+    if sys.argv[1] == '--csv':
+        n = convert_csv(sys.argv[2], sys.argv[3])
+    else:
+        n = record(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 60.0)
+    print(f'{n} samples recorded')
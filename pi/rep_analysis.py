@@ -1,6 +1,9 @@
 # import smbus2
 # import gpiozero
 
+import os
+import re
+import sys
 from dataclasses import dataclass
 from enum import Enum
 import numpy as np
@@ -55,8 +58,133 @@ class SetData:
     rep_indices : list[int]
     ts : float
 
+
+class SetBuffer:
+    """
+    Columnar, preallocated version of SetData:
+        accel, vel, pos, magn : N x 3 float64 blocks
+        sample_times          : N float64
+        rep_indices           : R int64
+
+    The blocks grow by doubling (amortised O(1) append), and every accessor
+    returns a view onto the filled rows: data.vel[:, 0] or data.accel[a:b]
+    never copy, so the analysis functions can take them as-is.
+    clear() keeps the allocation for the next set.
+    """
+    ts: float
+    n: int
+    n_reps: int
+
+    def __init__(self, ts: float, capacity: int = 4096):
+        self.ts = ts
+        self.n = 0
+        self.n_reps = 0
+        self._accel = np.empty((capacity, 3))
+        self._vel = np.empty((capacity, 3))
+        self._pos = np.empty((capacity, 3))
+        self._magn = np.empty((capacity, 3))
+        self._times = np.empty(capacity)
+        self._reps = np.empty(64, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @staticmethod
+    def _grown(block: np.ndarray, filled: int) -> np.ndarray:
+        new = np.empty((2 * len(block), *block.shape[1:]), dtype=block.dtype)
+        new[:filled] = block[:filled]
+        return new
+
+    def append(self, accel, vel, pos, magn, t: float) -> None:
+        i = self.n
+        if i == len(self._times):
+            self._accel = self._grown(self._accel, i)
+            self._vel = self._grown(self._vel, i)
+            self._pos = self._grown(self._pos, i)
+            self._magn = self._grown(self._magn, i)
+            self._times = self._grown(self._times, i)
+
+        self._accel[i] = accel
+        self._vel[i] = vel
+        self._pos[i] = pos
+        self._magn[i] = magn
+        self._times[i] = t
+        self.n = i + 1
+
+    def extend(self, accel, vel, pos, magn, t) -> None:
+        # a batch of samples (eg. one accelerometer FIFO drain): k x 3 blocks, k times
+        t = np.asarray(t, dtype=float).reshape(-1)
+        i, k = self.n, len(t)
+        while i + k > len(self._times):
+            self._accel = self._grown(self._accel, i)
+            self._vel = self._grown(self._vel, i)
+            self._pos = self._grown(self._pos, i)
+            self._magn = self._grown(self._magn, i)
+            self._times = self._grown(self._times, i)
+
+        self._accel[i:i+k] = accel
+        self._vel[i:i+k] = vel
+        self._pos[i:i+k] = pos
+        self._magn[i:i+k] = magn
+        self._times[i:i+k] = t
+        self.n = i + k
+
+    def mark_rep(self, index: int = None) -> None:
+        # live rep marker, defaults to the latest sample
+        if self.n_reps == len(self._reps):
+            self._reps = self._grown(self._reps, self.n_reps)
+        self._reps[self.n_reps] = self.n - 1 if index is None else index
+        self.n_reps += 1
+
+    @property
+    def accel(self) -> np.ndarray:
+        return self._accel[:self.n]
+
+    @property
+    def vel(self) -> np.ndarray:
+        return self._vel[:self.n]
+
+    @property
+    def pos(self) -> np.ndarray:
+        return self._pos[:self.n]
+
+    @property
+    def magn(self) -> np.ndarray:
+        return self._magn[:self.n]
+
+    @property
+    def sample_times(self) -> np.ndarray:
+        return self._times[:self.n]
+
+    @property
+    def rep_indices(self) -> np.ndarray:
+        return self._reps[:self.n_reps]
+
+    @rep_indices.setter
+    def rep_indices(self, indices) -> None:
+        indices = [] if indices is None else indices
+        self.n_reps = 0
+        for index in indices:
+            self.mark_rep(int(index))
+
+    def rep_slices(self) -> list[slice]:
+        # rep i covers [rep_indices[i], rep_indices[i+1]), the last rep runs to the end
+        bounds = [*self.rep_indices.tolist(), self.n]
+        return [slice(bounds[i], bounds[i+1]) for i in range(len(bounds) - 1)]
+
+    def reps(self, signal: str) -> list[np.ndarray]:
+        # per-rep views of one signal ('accel', 'vel', 'pos', 'magn')
+        block = getattr(self, signal)
+        return [block[rep] for rep in self.rep_slices()]
+
+    def clear(self) -> None:
+        self.n = 0
+        self.n_reps = 0
+
 ## UTILS FUNCTIONS
 def isolate_axis(points: list[list[float]], axis: int) -> list[float]:
+    if isinstance(points, np.ndarray):
+        return points[:, axis] # column view, no copy
     return [point[axis] for point in points]
 
 def join_axis(x : list[float] , y : list[float] , z : list[float]) -> list[list[float]]:
@@ -69,40 +197,108 @@ def zscore_to_percentile(score: float) -> float:
 def find_highest_peak(sig : list[float], offset : int):
     tmp_peaks, peak_props = signal.find_peaks(sig, -1 * np.inf)
     print(f'tmp_peaks: {tmp_peaks} \n peaks_props: {peak_props}')
-    if peak_props['peak_heights'] == [] or peak_props['peak_heights'].size == 0:
+    if peak_props['peak_heights'].size == 0:
         return int(offset)
     highest = np.argmax(peak_props["peak_heights"]) if tmp_peaks is not None else 0
     return int(tmp_peaks[highest] + offset)
 
 
 ## ANALYSIS FUNCTIONS
-def sort_reps(data: SetData, reps_live : list[int] , sel):
-    vel_smoothed = MovingAverage(50)
-    vel_smoothed = [vel_smoothed.update(val[sel[0]]) for val in data.vel] #smoothed velocity
+def sort_reps(data: SetData | SetBuffer, reps_live : list[int] , sel):
+    vel_smoothed = MovingAverage(50).update_many(isolate_axis(data.vel, sel[0])) #smoothed velocity
     # print(f'vel_smoothed shape: {np.shape(vel_smoothed)}')
     pos_peaks = []
-    reps_live = data.rep_indices
-    reps_live.insert(0, 0)
+    reps_live = [0, *data.rep_indices]
 
     for i in range(1, len(reps_live)):
         current = int(reps_live[i-1])
         next = int(reps_live[i])
         window = vel_smoothed[current:next]
-        if not window:
+        if len(window) == 0:
             continue
         pos_peaks.append(find_highest_peak(window,current))
 
     # must also do on the last window
     # reps_live[-1] now becomes current
     window = vel_smoothed[reps_live[-1] :]
-    if not window:
+    if len(window) == 0:
         return
     pos_peaks.append(find_highest_peak(window, reps_live[-1]))
     return pos_peaks
 
 
-def separate_reps(data: SetData, sel):
-    data.rep_indices = sort_reps(data, data.rep_indices, sel)
+class OnlineRepSegmenter:
+    """
+    sort_reps, one sample at a time:
+    the smoothed velocity (same MovingAverage(50) on vel[sel[0]]) is kept as
+    samples arrive, and as soon as Workout.update counts the next live rep the
+    window since the previous live rep is complete, so its highest peak is
+    committed right away.
+    Only the window after the last live rep is left for finish() at set end.
+
+        segmenter.update(vel[sel[0]])   # every sample
+        segmenter.mark_rep()            # live rep counted on the latest sample
+        rep_indices = segmenter.finish()
+    """
+    axis: int
+    n: int
+    boundaries: list[int]
+
+    def __init__(self, axis: int, M: int = 50, capacity: int = 4096):
+        self.axis = axis
+        self.filter = MovingAverage(M)
+        self._smoothed = np.empty(capacity)
+        self.n = 0
+        self.last_live = 0 # start of the window still open
+        self.boundaries = []
+
+    def update(self, vel_axis: float) -> None:
+        if self.n == len(self._smoothed):
+            self._smoothed = SetBuffer._grown(self._smoothed, self.n)
+        self._smoothed[self.n] = self.filter.update(vel_axis)
+        self.n += 1
+
+    def extend(self, vel_axis) -> None:
+        # a batch of samples, mark_rep(index) can then point anywhere inside it
+        smoothed = self.filter.update_many(vel_axis)
+        while self.n + len(smoothed) > len(self._smoothed):
+            self._smoothed = SetBuffer._grown(self._smoothed, self.n)
+        self._smoothed[self.n:self.n + len(smoothed)] = smoothed
+        self.n += len(smoothed)
+
+    @property
+    def smoothed(self) -> np.ndarray:
+        return self._smoothed[:self.n]
+
+    def mark_rep(self, index: int = None) -> int | None:
+        # index: live rep marker (defaults to the latest sample), returns the committed boundary
+        index = self.n - 1 if index is None else index
+        current = self.last_live
+        self.last_live = index
+        window = self._smoothed[current:index]
+        if len(window) == 0:
+            return None
+        peak = find_highest_peak(window, current)
+        self.boundaries.append(peak)
+        return peak
+
+    def finish(self) -> list[int]:
+        # the last window, every refined boundary of the set
+        window = self._smoothed[self.last_live:self.n]
+        if len(window) == 0:
+            return list(self.boundaries)
+        return [*self.boundaries, find_highest_peak(window, self.last_live)]
+
+    def clear(self, axis: int = None) -> None:
+        self.axis = self.axis if axis is None else axis
+        self.filter.clear()
+        self.n = 0
+        self.last_live = 0
+        self.boundaries = []
+
+
+def split_reps(data: SetData | SetBuffer):
+    # per-rep slices of every signal, at the (already refined) data.rep_indices
     indices = data.rep_indices
 
     accel_reps = []
@@ -123,19 +319,33 @@ def separate_reps(data: SetData, sel):
     return accel_reps, vel_reps, pos_reps, magn_reps, data
 
 
+def separate_reps(data: SetData | SetBuffer, sel):
+    data.rep_indices = sort_reps(data, data.rep_indices, sel)
+    return split_reps(data)
+
+
+## PER-REP TERMS
+# what the set analysis needs from each rep, can be computed as soon as the rep closes
+def pos_range(pos_rep) -> np.ndarray:
+    pos_rep = np.asarray(pos_rep)
+    return np.max(pos_rep, axis=0) - np.min(pos_rep, axis=0)
+
+def jerk_range(accel_rep, dt: float = 1) -> np.ndarray:
+    accel_rep = np.asarray(accel_rep)
+    if len(accel_rep) < 2:
+        # no jerk in a single sample rep: 0, like segment_jerk_ranges
+        return np.zeros(accel_rep.shape[1:])
+    jerk = np.diff(accel_rep, axis=0)/dt
+    return np.max(jerk, axis=0) - np.min(jerk, axis=0)
+
+
 #Returns percentage score of how consistent the distance travelled in reps is
 def distance_analysis(pos_reps) -> list[float]:
-    num_reps = len(pos_reps)
-    # pos_reps = num_reps x num_points x 3   --> pos_reps = num_reps x 3 x num_points
-    pos_reps = [[isolate_axis(pos_reps[i], 0), isolate_axis(pos_reps[i], 1), isolate_axis(pos_reps[i], 2)] for i in range(num_reps)]
-    pos_ranges = []
-    for i in range(num_reps): # num_reps x 3
-        pos_ranges.append([
-            np.max(pos_reps[i][0]) - np.min(pos_reps[i][0]),
-            np.max(pos_reps[i][1]) - np.min(pos_reps[i][1]),
-            np.max(pos_reps[i][2]) - np.min(pos_reps[i][2])
-        ])
+    return distance_scores([pos_range(pos_rep) for pos_rep in pos_reps])
 
+def distance_scores(pos_ranges) -> list[float]:
+    num_reps = len(pos_ranges)
+    # num_reps x 3
     xranges = isolate_axis(pos_ranges, 0)
     yranges = isolate_axis(pos_ranges, 1)
     zranges = isolate_axis(pos_ranges, 2)
@@ -161,23 +371,11 @@ def time_consistency_analysis(t, reps):
 def shakiness_analysis(accel_reps, dt:float=1):
     # shakiness = [np.var(vel[rep[0]:rep[1]]) for rep in reps]
     # return [100*(1/(1+shak)) for shak in shakiness]
-    rep_nb = len(accel_reps)
-    accel_reps = [[isolate_axis(accel_reps[i], 0), isolate_axis(accel_reps[i], 1), isolate_axis(accel_reps[i], 2)] for i in range(rep_nb)]
-    # print(f'accel_reps shape: {np.shape(accel_reps)}')
-    jerk_reps = [] # num_reps x 3 x num_points
-    for i in range(rep_nb):
-        jerk_reps.append([np.diff(accel_reps[i][0])/dt, 
-                          np.diff(accel_reps[i][1])/dt, 
-                          np.diff(accel_reps[i][2])/dt])
-
-    jerk_ranges = [] # num_reps x 3
-    for i in range(rep_nb):
-        jerk_ranges.append([np.max(jerk_reps[i][0]) - np.min(jerk_reps[i][0]),
-                            np.max(jerk_reps[i][1]) - np.min(jerk_reps[i][1]),
-                            np.max(jerk_reps[i][2]) - np.min(jerk_reps[i][2])])
-
-    # print(f'jerk_ranges shape: {np.shape(jerk_ranges)}')
+    return shakiness_scores([jerk_range(accel_rep, dt) for accel_rep in accel_reps])
 
+def shakiness_scores(jerk_ranges) -> list[float]:
+    rep_nb = len(jerk_ranges)
+    # num_reps x 3
     xjerk_ranges = isolate_axis(jerk_ranges, 0)
     yjerk_ranges = isolate_axis(jerk_ranges, 1)
     zjerk_ranges = isolate_axis(jerk_ranges, 2)
@@ -195,6 +393,79 @@ def shakiness_analysis(accel_reps, dt:float=1):
     return [100 - zscore_to_percentile(score) for score in rep_scores]
 
 
+## VECTORIZED SET ANALYSIS
+# the same three scores over the whole set at once: reps stacked in one N x 3
+# array, rep i is rows offsets[i]:offsets[i+1]
+# degenerate sets are deterministic instead of NaN: an axis with no spread
+# across reps (eg. a single rep) has zscore 0, fewer than 2 reps have pace score 100
+def rep_offsets(rep_lengths) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(rep_lengths))).astype(np.int64)
+
+def segment_ranges(sig: np.ndarray, offsets) -> np.ndarray:
+    # num_reps x 3, max - min of every rep
+    starts = np.asarray(offsets[:-1])
+    return np.maximum.reduceat(sig, starts, axis=0) - np.minimum.reduceat(sig, starts, axis=0)
+
+def segment_jerk_ranges(accel: np.ndarray, offsets, dt: float = 1) -> np.ndarray:
+    # one np.diff over the set, the diffs across rep boundaries are overwritten
+    # by the previous one of the same rep (min / max unchanged), single sample reps give 0
+    offsets = np.asarray(offsets)
+    lengths = np.diff(offsets)
+    last = offsets[1:] - 1
+    jerk = np.empty_like(accel, dtype=float)
+    jerk[:-1] = np.diff(accel, axis=0)/dt
+    long = lengths > 1
+    jerk[last[long]] = jerk[last[long] - 1]
+    jerk[last[~long]] = 0
+    return segment_ranges(jerk, offsets)
+
+def safe_zscore(x: np.ndarray) -> np.ndarray:
+    # scipy.stats.zscore along the reps (ddof=0), 0 where all reps are equal
+    # (checked on max == min, std of equal values can round to ~1e-17 instead of 0)
+    x = np.asarray(x, dtype=float)
+    if len(x) == 0:
+        return x.copy() # no reps
+    spread = np.max(x, axis=0) > np.min(x, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (x - x.mean(axis=0))/x.std(axis=0)
+    return np.where(spread, z, 0.0)
+
+def range_percentiles(ranges) -> np.ndarray:
+    # mean zscore of the 3 axes of every rep, as a two-sided percentile
+    return zscore_to_percentile(safe_zscore(ranges).mean(axis=1))
+
+def pace_consistency(t, reps) -> np.ndarray:
+    # time_consistency_analysis: 100 * r^2 of rep number against rep time
+    num_reps = len(reps)
+    if num_reps < 2:
+        return np.full(num_reps, 100.0)
+    t_reps = np.asarray(t)[np.asarray(reps)]
+    tm = t_reps - t_reps.mean()
+    nm = np.arange(num_reps) - (num_reps - 1)/2
+    denom = np.sqrt(np.dot(tm, tm) * np.dot(nm, nm))
+    r_value = np.clip(np.dot(tm, nm)/denom, -1, 1) if denom > 0 else 0.0
+    return np.full(num_reps, 100*r_value**2)
+
+def set_analysis_from_ranges(pos_ranges, jerk_ranges, sample_times, rep_indices):
+    # distance, time consistency and shakiness scores of every rep (num_reps x 3 ranges,
+    # reshaped: np.asarray([]) of a set without reps is (0,), not (0, 3))
+    pos_ranges = np.asarray(pos_ranges, dtype=float).reshape(-1, 3)
+    jerk_ranges = np.asarray(jerk_ranges, dtype=float).reshape(-1, 3)
+    return (range_percentiles(pos_ranges),
+            pace_consistency(sample_times, rep_indices),
+            100 - range_percentiles(jerk_ranges))
+
+def set_analysis(accel: np.ndarray, pos: np.ndarray, offsets, sample_times, rep_indices, dt: float = 1):
+    if len(offsets) < 2:
+        # no reps: empty score arrays
+        return set_analysis_from_ranges(np.empty((0, 3)), np.empty((0, 3)), sample_times, [])
+    return set_analysis_from_ranges(segment_ranges(pos, offsets),
+                                    segment_jerk_ranges(accel, offsets, dt),
+                                    sample_times, rep_indices)
+
+
+NO_REPS_FEEDBACK = "No reps were detected in this set."
+
 def pos_score_to_feedback(score) -> str:
     if score > 70:
         return "Great job! You're keeping your range consistent throughout the reps."
@@ -234,20 +505,28 @@ def pos_time_shak_to_overall_score(pos_score, time_score, shakiness_score):
 # def give_feedback(data : SetData, exercise : Workout) -> dict[str, float|str]:
 def give_feedback(accel_reps, vel_reps, pos_reps, mag_reps, sample_times, rep_indices) -> dict[str, float|str]:
     # accel_reps, _, pos_reps, _, data = separate_reps(data, exercise.select)
-    reps = rep_indices
-    feedback = []
-    rep_scores = []
-    num_reps = len(reps)
+    num_reps = len(rep_indices)
     print(f'num_reps passed in: {num_reps}')
-
-    dist_scores = distance_analysis(pos_reps)
-    print(f'len dist_scores: {len(dist_scores)}, len pos: {len(pos_reps)}')
-    time_consistency_scores = time_consistency_analysis(sample_times, reps)
-    shakiness_scores = shakiness_analysis(accel_reps)
-
-
-    # [rep_scores.append(pos_time_shak_to_overall_score(dist_scores[i],time_consistency_scores[i],shakiness_scores[i])) for i in range(0,num_reps-1)]
-    rep_scores = [pos_time_shak_to_overall_score(dist_scores[i],time_consistency_scores[i],shakiness_scores[i]) for i in range(num_reps)]
+    if num_reps == 0 or len(accel_reps) == 0:
+        return feedback_from_scores([], [], [])
+    offsets = rep_offsets([len(rep) for rep in accel_reps])
+    scores = set_analysis(np.concatenate(accel_reps), np.concatenate(pos_reps), offsets,
+                          sample_times, rep_indices)
+    return feedback_from_scores(*scores)
+
+def feedback_from_ranges(pos_ranges, jerk_ranges, sample_times, rep_indices) -> dict[str, float|str]:
+    # give_feedback from the per-rep terms only (pos_range, jerk_range of every rep)
+    num_reps = len(rep_indices)
+    print(f'num_reps passed in: {num_reps}')
+    return feedback_from_scores(*set_analysis_from_ranges(np.asarray(pos_ranges), np.asarray(jerk_ranges),
+                                                          sample_times, rep_indices))
+
+def feedback_from_scores(dist_scores, time_consistency_scores, shak_scores) -> dict[str, float|str]:
+    if len(dist_scores) == 0:
+        return no_reps_feedback()
+    rep_scores = pos_time_shak_to_overall_score(np.asarray(dist_scores),
+                                                np.asarray(time_consistency_scores),
+                                                np.asarray(shak_scores))
     # print(f'rep_scores: {rep_scores}')
     feedback = {
         "score" : np.mean(rep_scores),
@@ -255,12 +534,25 @@ def give_feedback(accel_reps, vel_reps, pos_reps, mag_reps, sample_times, rep_in
         "distance_feedback" : pos_score_to_feedback(np.mean(dist_scores)),
         "time_consistency_score": np.mean(time_consistency_scores),
         "time_consistency_feedback" : time_score_to_feedback(np.mean(time_consistency_scores)),
-        "shakiness_score": np.mean(shakiness_scores),
-        "shakiness_feedback" : shakiness_score_to_feedback(np.mean(shakiness_scores))
+        "shakiness_score": np.mean(shak_scores),
+        "shakiness_feedback" : shakiness_score_to_feedback(np.mean(shak_scores))
     }
 
     return feedback
 
+def no_reps_feedback() -> dict[str, float|str]:
+    # a set without a single rep (eg. stopped right after it started): zero scores,
+    # not the NaN means of empty arrays (the server stores the scores as Decimals)
+    return {
+        "score" : 0.0,
+        "distance_score": 0.0,
+        "distance_feedback" : NO_REPS_FEEDBACK,
+        "time_consistency_score": 0.0,
+        "time_consistency_feedback" : NO_REPS_FEEDBACK,
+        "shakiness_score": 0.0,
+        "shakiness_feedback" : NO_REPS_FEEDBACK
+    }
+
 def workout_feedback(feedbacks: list[ dict[str, float | str] ]):
     # sorted_feedbacks = sorted(feedbacks, key=lambda x: x['score'])
     # worst_feedback = sorted_feedbacks[-1]
@@ -325,5 +617,73 @@ def main() -> None:
 
 
 
+def check_set_analysis(n_sets: int = 20, seed: int = 0) -> None:
+    # vectorized set analysis against the per-rep versions (python rep_analysis.py --check)
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    for _ in range(n_sets):
+        lengths = rng.integers(2, 400, rng.integers(2, 40))
+        offsets = rep_offsets(lengths)
+        accel = rng.standard_normal((offsets[-1], 3))
+        pos = np.cumsum(rng.standard_normal((offsets[-1], 3)), axis=0)
+        t = np.sort(rng.uniform(0, 100, offsets[-1]))
+        reps = offsets[:-1]
+        accel_reps = [accel[offsets[i]:offsets[i+1]] for i in range(len(lengths))]
+        pos_reps = [pos[offsets[i]:offsets[i+1]] for i in range(len(lengths))]
+
+        new = set_analysis(accel, pos, offsets, t, reps)
+        old = (distance_analysis(pos_reps), time_consistency_analysis(t, reps), shakiness_analysis(accel_reps))
+        for a, b in zip(new, old):
+            worst = max(worst, float(np.max(np.abs(np.asarray(a) - np.asarray(b)))))
+    print(f'max difference over {n_sets} sets: {worst:.3g}')
+    assert worst < 1e-9
+
+    # degenerate: one rep, identical reps, no reps
+    print('single rep     :', [list(x) for x in set_analysis(accel[:50], pos[:50], [0, 50], t, [0])])
+    same = np.tile(accel[:50], (3, 1))
+    print('identical reps :', [list(x) for x in set_analysis(same, same, [0, 50, 100, 150], t, [0, 50, 100])])
+    empty = np.empty((0, 3))
+    no_reps = set_analysis(empty, empty, [0], t, [])
+    assert all(x.shape == (0,) for x in no_reps)
+    assert all(x.shape == (0,) for x in set_analysis_from_ranges([], [], t, []))
+    for feedback in (give_feedback([], [], [], [], t, []), feedback_from_ranges([], [], t, [])):
+        assert feedback == no_reps_feedback()
+    print('no reps        :', [list(x) for x in no_reps], no_reps_feedback()['score'])
+
+
+def check_online_segmentation(csv_name: str = '50_points.csv', reps_name: str = '50_points_reps.txt') -> None:
+    # OnlineRepSegmenter against sort_reps on a recorded set (python rep_analysis.py --check)
+    here = os.path.dirname(os.path.abspath(__file__))
+    data = np.loadtxt(os.path.join(here, csv_name), delimiter=',', ndmin=2) # time | accel xyz | vel xyz | pos xyz
+    with open(os.path.join(here, reps_name)) as file:
+        live_reps = [int(index) for index in re.findall(r'Index : (\d+)', file.read())]
+    vel = data[:, 4:7]
+    sel = Workout('Rows').select
+    batch = sort_reps(SetData(data[:, 1:4], vel, data[:, 7:10], [], data[:, 0], live_reps, 0.01), live_reps, sel)
+
+    # one sample at a time, live rep counted on the latest sample (SamplePipeline.process)
+    segmenter = OnlineRepSegmenter(sel[0])
+    live = set(live_reps)
+    for i, v in enumerate(vel[:, sel[0]]):
+        segmenter.update(v)
+        if i in live:
+            segmenter.mark_rep()
+    assert segmenter.finish() == batch, 'per sample boundaries differ from sort_reps'
+
+    # FIFO batches of 10, live reps anywhere inside a batch (SamplePipeline.process_batch)
+    segmenter.clear(sel[0])
+    for start in range(0, len(vel), 10):
+        segmenter.extend(vel[start:start + 10, sel[0]])
+        for index in live_reps:
+            if start <= index < start + 10:
+                segmenter.mark_rep(index)
+    assert segmenter.finish() == batch, 'batched boundaries differ from sort_reps'
+    print(f'{csv_name}: {len(batch)} online boundaries == sort_reps')
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if sys.argv[1:] == ['--check']:
+        check_set_analysis()
+        check_online_segmentation()
+    else:
+        main()
\ No newline at end of file
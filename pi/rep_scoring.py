@@ -0,0 +1,86 @@
+import os
+import time
+
+import numpy as np
+
+from feature_schema import FEATURE_COLUMNS
+from tree_ensemble import TreeEnsemble
+
+"""
+NOTE:
+Rep quality scored on the Pi, as soon as a rep closes (pipeline.py), with the
+server's models exported to flat tree arrays (backend/tree_export.py writes
+them to pi/models/). numpy only: no pandas, sklearn or xgboost on the device,
+a model loads in ~1 ms.
+
+    scorer = load_scorer('Lat Pulldowns')     # None if there is no model for it
+    quality = scorer.score(features_row)      # 96 features, FEATURE_COLUMNS order
+
+The trees are walked by tree_ensemble.TreeEnsemble, the code the server runs
+too, so the same model gives the same score on both sides (bit for bit with the
+exact export). Files exported with float16 thresholds / leaf values or a max
+depth load the same way.
+
+    python rep_scoring.py    # load time, per-rep latency
+"""
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+MODEL_FILES = {
+    'Seated Cable Rows': 'seated_cable_rows.npz',
+    'Lat Pulldowns': 'lat_pulldowns.npz',
+}
+
+
+class RepScorer(TreeEnsemble):
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        # FEATURE_COLUMNS position of every model feature
+        position = {column: i for i, column in enumerate(FEATURE_COLUMNS)}
+        missing = [name for name in self.feature_names if name not in position]
+        if missing:
+            raise ValueError(f'model uses features the Pi does not compute: {missing[:5]}')
+        self.columns = np.array([position[name] for name in self.feature_names], dtype=np.intp)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        reps x 96 (FEATURE_COLUMNS order) -> float32 quality per rep
+        """
+        return super().predict(np.atleast_2d(features)[:, self.columns])
+
+    def score(self, features: np.ndarray) -> float:
+        # one rep
+        return float(self.predict(features)[0])
+
+
+_scorers = {}
+
+
+def load_scorer(exercise: str) -> RepScorer | None:
+    # cached: loaded on the first set of each exercise
+    if exercise not in _scorers:
+        file = MODEL_FILES.get(exercise)
+        path = os.path.join(MODEL_DIR, file) if file else None
+        if path is None or not os.path.exists(path):
+            print(f'No rep scoring model for {exercise}, qualities are computed by the server')
+            _scorers[exercise] = None
+        else:
+            _scorers[exercise] = RepScorer.load(path)
+    return _scorers[exercise]
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    for exercise, file in MODEL_FILES.items():
+        path = os.path.join(MODEL_DIR, file)
+        start = time.perf_counter()
+        scorer = RepScorer.load(path)
+        load_ms = (time.perf_counter() - start) * 1e3
+
+        row = rng.standard_normal(len(FEATURE_COLUMNS))
+        times = []
+        for _ in range(200):
+            start = time.perf_counter()
+            scorer.score(row)
+            times.append(time.perf_counter() - start)
+        print(f'{exercise}: {os.path.getsize(path)} B, load {load_ms:.2f} ms,'
+              f' one rep {min(times) * 1e6:.0f} us (median {np.median(times) * 1e6:.0f} us)')
@@ -0,0 +1,166 @@
+import sys
+import time
+
+import numpy as np
+
+import accelerometer
+import magnet
+from fake_bus import FakeBus, FakeLIS3DH, FakeMLX90393
+from model_preprocessing import clear_workout_features
+from pipeline import SamplePipeline
+from recording import read_recording, ACCEL, MAG
+
+"""
+NOTE:
+Replays a sensor recording (recording.py) through the real drivers and the full
+main.py pipeline, with no hardware and no sleeping:
+
+    recording -> ReplayBus (fake I2C) -> lis3dh_read_xyz / Mag_Read
+              -> SamplePipeline.process (filters, SetBuffer, rep counter)
+              -> SamplePipeline.end_set (segmentation, feedback, features, rep qualities)
+
+and reports throughput and per-sample / end-of-set latency.
+
+With --fifo it replays the way main.py runs with ACCEL_FIFO: the fake LIS3DH
+fills its FIFO at the ODR on a replay clock, every BATCH_PERIOD the loop drains
+it with lis3dh_fifo_read and hands the batch to SamplePipeline.process_batch,
+the recorded magnetometer samples are published into a MagSampler and joined
+on the batch timestamps (which are the driver's, spaced 1/odr, like on the Pi).
+
+    python replay.py capture.rec [exercise] [--fifo]
+"""
+
+BATCH_PERIOD = 0.1 # s, main.py's (not imported: main.py opens the HTTP session at import)
+USAGE = 'usage: python replay.py capture.rec [exercise] [--fifo]'
+
+
+
+class ReplayBus(FakeBus):
+    """
+    Every accelerometer read returns the next recorded sample and moves the
+    replay clock to its timestamp, magnetometer reads return the latest
+    recorded sample at that time (zero-order hold, zeros before the first one)
+    """
+    def __init__(self, recording: np.ndarray):
+        accel = recording[recording['kind'] == ACCEL]
+        mag = recording[recording['kind'] == MAG]
+        self.accel_t = accel['t_ns']
+        self.accel_xyz = accel['xyz'].astype(float).tolist()
+        self.mag_t = mag['t_ns']
+        self.mag_xyz = mag['xyz'].astype(int).tolist()
+
+        self.index = -1
+        self.t_ns = int(self.accel_t[0]) if len(self.accel_t) else 0
+        self.now = self.t_ns / 1e9 # FIFO mode: the LIS3DH samples on this clock
+
+        super().__init__({
+            accelerometer.LIS3DH_ADDRESS: FakeLIS3DH(source=self._next_accel, clock=lambda: self.now),
+            magnet.MLX90393_ADDR: FakeMLX90393(source=self._current_mag),
+        })
+
+    def __len__(self) -> int:
+        return len(self.accel_xyz)
+
+    def _next_accel(self):
+        self.index += 1
+        self.t_ns = int(self.accel_t[self.index])
+        return self.accel_xyz[self.index]
+
+    def _current_mag(self):
+        i = np.searchsorted(self.mag_t, self.t_ns, side='right') - 1
+        return self.mag_xyz[i] if i >= 0 else (0, 0, 0)
+
+
+def stream_samples(bus: ReplayBus, pipeline: SamplePipeline) -> tuple[int, np.ndarray]:
+    # one sample at a time: lis3dh_read_xyz every ts, Mag_Read every other sample
+    n = len(bus)
+    sample_ns = np.empty(n, dtype=np.int64)
+    reps = 0
+    mag = (0, 0, 0)
+    for i in range(n):
+        t0 = time.perf_counter_ns()
+        accel = accelerometer.lis3dh_read_xyz()
+        if i % 2 == 0:
+            mag = magnet.Mag_Read()
+        counted, _ = pipeline.process(accel, mag, bus.t_ns / 1e9)
+        reps += counted
+        sample_ns[i] = time.perf_counter_ns() - t0
+    return reps, sample_ns
+
+
+def stream_fifo(bus: ReplayBus, pipeline: SamplePipeline, ts: float,
+                batch_period: float = BATCH_PERIOD) -> tuple[int, np.ndarray]:
+    # main.py with ACCEL_FIFO: drain the FIFO every batch_period, one process_batch per drain
+    accelerometer.lis3dh_fifo_enable(hz=round(1/ts)) # starts the FIFO clock at bus.now
+    mag_sampler = magnet.MagSampler() # not started: fed from the recording below
+    end = bus.now + len(bus) / accelerometer.odr # the chip has taken every recorded sample
+    mag_i = 0
+    batch_ns = []
+    reps = 0
+    while bus.now < end:
+        bus.now = min(bus.now + batch_period, end)
+        t0 = time.perf_counter_ns()
+        # the magnetometer thread's reads up to now
+        while mag_i < len(bus.mag_t) and bus.mag_t[mag_i] <= bus.now * 1e9:
+            bus.t_ns = int(bus.mag_t[mag_i])
+            mag_sampler.publish(bus.t_ns / 1e9, magnet.Mag_Read())
+            mag_i += 1
+        times, accel = accelerometer.lis3dh_fifo_read(now=bus.now)
+        reps += len(pipeline.process_batch(accel, mag_sampler.samples_at(times), times))
+        batch_ns.append(time.perf_counter_ns() - t0)
+    accelerometer.lis3dh_fifo_disable()
+    return reps, np.array(batch_ns, dtype=np.int64)
+
+
+def replay(path: str, exercise: str = 'Seated Cable Rows', ts: float = 0.01,
+           fifo: bool = False) -> dict:
+    bus = ReplayBus(read_recording(path))
+    # the drivers bound i2c_bus.bus at import time
+    accelerometer.bus = bus
+    magnet.bus = bus
+
+    pipeline = SamplePipeline(ts)
+    pipeline.start_set(exercise, t=bus.t_ns / 1e9)
+    workout_features = clear_workout_features(None)
+
+    n = len(bus)
+    start = time.perf_counter_ns()
+    if fifo:
+        reps, sample_ns = stream_fifo(bus, pipeline, ts)
+    else:
+        reps, sample_ns = stream_samples(bus, pipeline)
+    stream_ns = time.perf_counter_ns() - start
+
+    t0 = time.perf_counter_ns()
+    feedback = pipeline.end_set(workout_features)
+    end_set_ns = time.perf_counter_ns() - t0
+
+    recorded_s = (int(bus.accel_t[-1]) - int(bus.accel_t[0])) / 1e9 if n else 0.0
+    # FIFO mode times whole batches (one drain + process_batch)
+    unit = 'batch' if fifo else 'sample'
+    m = len(sample_ns)
+    return {
+        'samples': n,
+        'recorded_s': recorded_s,
+        'live_reps': int(reps),
+        'reps': len(pipeline.data.rep_indices),
+        'samples_per_s': n / (stream_ns / 1e9) if stream_ns else 0.0,
+        'speedup': recorded_s / (stream_ns / 1e9) if stream_ns else 0.0,
+        f'{unit}_us_p50': float(np.percentile(sample_ns, 50) / 1e3) if m else 0.0,
+        f'{unit}_us_p99': float(np.percentile(sample_ns, 99) / 1e3) if m else 0.0,
+        f'{unit}_us_max': float(sample_ns.max() / 1e3) if m else 0.0,
+        'end_set_ms': end_set_ns / 1e6,
+        'bus_transactions': bus.transactions,
+        'feedback': feedback,
+        'rep_qualities': [round(q, 1) for q in pipeline.rep_qualities],
+    }
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--fifo']
+    if not args or args[0] in ('-h', '--help'):
+        print(USAGE)
+        sys.exit(0 if args else 2)
+    results = replay(args[0], *args[1:2], fifo='--fifo' in sys.argv[1:])
+    for key, value in results.items():
+        print(f'{key:>18}: {value}')
@@ -0,0 +1,161 @@
+import json
+import time
+
+"""
+NOTE:
+Fixed-rate loop timing against absolute deadlines on time.monotonic_ns():
+
+    deadline_k = start + k * period
+
+so the time spent reading sensors / filtering never adds up into the period
+(time.sleep(ts) at the top of the loop runs at 1 / (ts + work) instead).
+
+Overruns (the loop body finished after the next deadline) run the next
+iteration straight away, then:
+    'catchup' : keep the original grid, the missed iterations run back to back
+    'skip'    : drop the missed slots, realign to the next deadline in the future
+
+Per-iteration wake-up lateness (jitter) and loop-body time (latency) are
+counted in fixed-size histograms, no allocation per iteration.
+"""
+
+POLICIES = ('catchup', 'skip')
+
+
+class Histogram:
+    """
+    Fixed-size histogram in microseconds, the last bin counts everything >= n_bins * bin_us
+    """
+    def __init__(self, bin_us: int = 100, n_bins: int = 100):
+        self.bin_ns = bin_us * 1000
+        self.bin_us = bin_us
+        self.n_bins = n_bins
+        self.clear()
+
+    def clear(self) -> None:
+        self.counts = [0] * (self.n_bins + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, value_ns: int) -> None:
+        value_ns = max(value_ns, 0)
+        self.counts[min(value_ns // self.bin_ns, self.n_bins)] += 1
+        self.count += 1
+        self.total_ns += value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def percentile_us(self, q: float) -> float:
+        # upper edge of the bin holding the q-th percentile
+        if self.count == 0:
+            return 0.0
+        target = q / 100 * self.count
+        running = 0
+        for i, c in enumerate(self.counts):
+            running += c
+            if running >= target:
+                return float((i + 1) * self.bin_us) if i < self.n_bins else self.max_ns / 1000
+        return self.max_ns / 1000
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_us': self.total_ns / self.count / 1000 if self.count else 0.0,
+            'p50_us': self.percentile_us(50),
+            'p99_us': self.percentile_us(99),
+            'max_us': self.max_ns / 1000,
+            'bin_us': self.bin_us,
+            'counts': list(self.counts),
+        }
+
+
+class DeadlineScheduler:
+    period_ns: int
+    policy: str
+    iterations: int
+    overruns: int
+    skipped: int
+
+    def __init__(self, period: float, policy: str = 'skip', bin_us: int = 100, n_bins: int = 100):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown overrun policy {policy!r}, expected one of {POLICIES}')
+        self.period_ns = int(round(period * 1e9))
+        self.policy = policy
+        self.lateness = Histogram(bin_us, n_bins)   # wake-up time - deadline (jitter)
+        self.latency = Histogram(bin_us, n_bins)    # loop body time, wake-up to next wait()
+        self.start()
+
+    def start(self) -> None:
+        now = time.monotonic_ns()
+        self.next_deadline = now + self.period_ns
+        self.last_wake = now
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.iterations = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.lateness.clear()
+        self.latency.clear()
+
+    def wait(self) -> int:
+        """
+        Block until the next deadline, returns how late (ns) we woke up
+        """
+        now = time.monotonic_ns()
+        self.latency.add(now - self.last_wake)
+
+        deadline = self.next_deadline
+        if now < deadline:
+            time.sleep((deadline - now) / 1e9)
+            now = time.monotonic_ns()
+            self.next_deadline = deadline + self.period_ns
+        else:
+            # overrun: run now, without sleeping
+            self.overruns += 1
+            if self.policy == 'skip':
+                missed = (now - deadline) // self.period_ns
+                self.skipped += missed
+                self.next_deadline = deadline + (missed + 1) * self.period_ns
+            else:
+                self.next_deadline = deadline + self.period_ns
+
+        late = now - deadline
+        self.lateness.add(late)
+        self.last_wake = now
+        self.iterations += 1
+        return late
+
+    def report(self) -> dict:
+        return {
+            'period_us': self.period_ns / 1000,
+            'policy': self.policy,
+            'iterations': self.iterations,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'lateness': self.lateness.summary(),
+            'latency': self.latency.summary(),
+        }
+
+    def dump(self, path: str = None) -> None:
+        report = self.report()
+        if path is None:
+            print(f"Scheduler: {report['iterations']} iterations, {report['overruns']} overruns, "
+                  f"{report['skipped']} skipped | "
+                  f"lateness p50 {report['lateness']['p50_us']:.0f}us p99 {report['lateness']['p99_us']:.0f}us "
+                  f"max {report['lateness']['max_us']:.0f}us | "
+                  f"latency p50 {report['latency']['p50_us']:.0f}us p99 {report['latency']['p99_us']:.0f}us "
+                  f"max {report['latency']['max_us']:.0f}us")
+            return
+        with open(path, 'w') as file:
+            json.dump(report, file)
+
+
+if __name__ == '__main__':
+    # 100 Hz with a ~2 ms body and an occasional 35 ms stall
+    scheduler = DeadlineScheduler(0.01)
+    for i in range(300):
+        scheduler.wait()
+        time.sleep(0.035 if i % 100 == 99 else 0.002)
+    scheduler.dump()
@@ -0,0 +1,155 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+"""
+NOTE:
+Durable offline spool for the set / workout uploads.
+
+    main loop --put(endpoint, body)--> [SQLite, WAL] --flusher thread--> backend
+
+put() only commits the request locally (a few ms, no network) and wakes the
+flusher. The flusher sends pending rows in id order, in batches, and deletes a
+row once the server acknowledged it. On a network error or 5xx it stops (order
+matters: the workout upload must follow its sets) and retries later with
+backoff, so a dropped gym Wi-Fi only delays uploads.
+
+Each row carries a unique Idempotency-Key header, so the server can recognise
+a replay of a request it already processed (eg. the ack was lost).
+Rows the server rejects for good (4xx, or too many attempts) are kept but
+marked dead instead of blocking the queue forever.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    key      TEXT    NOT NULL UNIQUE,
+    endpoint TEXT    NOT NULL,
+    headers  TEXT    NOT NULL,
+    body     BLOB    NOT NULL,
+    created  REAL    NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    dead     INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# the server is overloaded / mid-request with the same key: try again later
+RETRY_STATUSES = (408, 409, 425, 429)
+
+
+class UploadSpool:
+    path: str
+    batch_size: int
+    max_attempts: int
+    sent: int
+    failed: int
+
+    def __init__(self, path: str, send, batch_size: int = 16, retry_interval: float = 2.0,
+                 max_retry_interval: float = 60.0, max_attempts: int = 50):
+        """
+        send(endpoint, body, headers) -> HTTP status code, raises on network errors
+        """
+        self.path = path
+        self.send = send
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.failed = 0
+
+        # one connection shared by the loop and the flusher, serialised by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=FULL')
+        self._db.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+        self._wake = threading.Event()
+        self._running = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='spool', daemon=True)
+
+    def put(self, endpoint: str, body: bytes, headers: dict[str, str]) -> str:
+        key = str(uuid.uuid4())
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO spool (key, endpoint, headers, body, created) VALUES (?, ?, ?, ?, ?)',
+                (key, endpoint, json.dumps(headers), sqlite3.Binary(body), time.time())
+            )
+        self._wake.set()
+        return key
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM spool WHERE dead = 0').fetchone()[0]
+
+    def flush(self) -> bool:
+        """
+        Send one batch, returns True if every row in it was handled
+        (False: backend unreachable or busy, try again later)
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, key, endpoint, headers, body, attempts FROM spool '
+                'WHERE dead = 0 ORDER BY id LIMIT ?', (self.batch_size,)
+            ).fetchall()
+
+        for row_id, key, endpoint, headers, body, attempts in rows:
+            headers = {**json.loads(headers), 'Idempotency-Key': key}
+            try:
+                status = self.send(endpoint, bytes(body), headers)
+            except Exception as e:
+                print(f'Spool: {endpoint} unreachable ({e}), {len(rows)} queued')
+                self._failed_attempt(row_id, attempts)
+                return False
+
+            if 200 <= status < 300:
+                with self._lock:
+                    self._db.execute('DELETE FROM spool WHERE id = ?', (row_id,))
+                self.sent += 1
+            elif status >= 500 or status in RETRY_STATUSES:
+                self._failed_attempt(row_id, attempts)
+                return False
+            else:
+                print(f'Spool: {endpoint} rejected with {status}, giving up on {key}')
+                self._kill(row_id)
+        return True
+
+    def _failed_attempt(self, row_id: int, attempts: int) -> None:
+        with self._lock:
+            self._db.execute('UPDATE spool SET attempts = attempts + 1 WHERE id = ?', (row_id,))
+        if attempts + 1 >= self.max_attempts:
+            self._kill(row_id)
+
+    def _kill(self, row_id: int) -> None:
+        with self._lock:
+            self._db.execute('UPDATE spool SET dead = 1 WHERE id = ?', (row_id,))
+        self.failed += 1
+
+    def start(self) -> None:
+        self._running.set()
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._running.clear()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        delay = self.retry_interval
+        while self._running.is_set():
+            if self.pending() == 0:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            if self.flush():
+                delay = self.retry_interval
+                continue
+
+            # backend down: back off, but wake up early for new uploads
+            self._wake.wait(delay)
+            self._wake.clear()
+            delay = min(2 * delay, self.max_retry_interval)
@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+
+"""
+NOTE:
+The one evaluator of the exported rep-quality models (flat tree arrays in an
+.npz, written by backend/tree_export.py), numpy only. The server
+(backend/tree_ensemble.py is a link to this file: model_registry.py,
+inference.py) and the Pi (rep_scoring.py) run this same code, so a rep gets the
+same score on both sides.
+
+Every node of every tree is one entry of the arrays:
+    feature, threshold      split: go left if x[feature] < threshold (float32,
+                            like XGBoost), NaN goes to default_left
+    left, right             children (global node indices), right = left + 1,
+                            a leaf points to itself
+    value                   leaf value (0 for splits)
+    roots                   first node of each tree
+    base_score              prediction before any tree
+
+predict walks all rows through all trees at once, one tree level per step
+(max_depth steps), then adds the leaf values tree by tree: same predictions as
+XGBoost's model.predict, bit for bit.
+
+Non-finite features: NaN is a missing value (default branch, like XGBoost).
+inf is treated as missing too (XGBoost refuses it): a rep with an infinite
+feature is scored, not rejected.
+"""
+
+
+class TreeEnsemble:
+    def __init__(self, arrays):
+        # files store the smallest dtypes that fit, widened here once
+        self.feature = np.asarray(arrays['feature'], dtype=np.intp)
+        self.threshold = np.asarray(arrays['threshold'], dtype=np.float32)
+        self.left = np.asarray(arrays['left'], dtype=np.intp)
+        self.default_left = np.asarray(arrays['default_left'], dtype=bool)
+        self.value = np.asarray(arrays['value'], dtype=np.float32)
+        self.roots = np.asarray(arrays['roots'], dtype=np.intp)
+        self.base_score = np.float32(arrays['base_score'])
+        self.max_depth = int(arrays['max_depth'])
+        self.feature_names = [str(name) for name in arrays['feature_names']]
+
+        # the walk only follows left (+1 to go right): check export_arrays' layout
+        right = np.asarray(arrays['right'], dtype=np.intp)
+        is_leaf = self.left == np.arange(len(self.left))
+        if not np.array_equal(right, np.where(is_leaf, self.left, self.left + 1)):
+            raise ValueError('right children are not next to left ones, re-export the model')
+        if not (self.default_left[is_leaf].all() and (self.threshold[is_leaf] == np.inf).all()):
+            raise ValueError('leaves must route every value left, re-export the model')
+
+    @classmethod
+    def load(cls, path: str) -> 'TreeEnsemble':
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(arrays)
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> 'TreeEnsemble':
+        with np.load(io.BytesIO(body), allow_pickle=False) as arrays:
+            return cls(arrays)
+
+    def leaves(self, rows) -> np.ndarray:
+        # rows x trees leaf node index
+        rows = np.ascontiguousarray(rows, dtype=np.float32)
+        n_rows, n_features = rows.shape
+        finite = np.isfinite(rows).all()
+        if not finite:
+            # inf -> missing, on a copy (leaves rely on x < inf)
+            rows = np.where(np.isinf(rows), np.float32(np.nan), rows)
+
+        flat = rows.ravel()
+        row_start = (np.arange(n_rows) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots)))
+        for _ in range(self.max_depth):
+            x = flat[row_start + self.feature[nodes]]
+            go_right = x >= self.threshold[nodes] # leaves: x < inf
+            if not finite:
+                go_right |= np.isnan(x) & ~self.default_left[nodes]
+            nodes = self.left[nodes] + go_right
+        return nodes
+
+    def predict(self, rows) -> np.ndarray:
+        """
+        rows x features (model feature order) -> float32 predictions
+        """
+        values = self.value[self.leaves(rows)]
+        # float32, tree by tree in order (cumsum doesn't reorder), like XGBoost
+        total = np.empty((len(values), values.shape[1] + 1), dtype=np.float32)
+        total[:, 0] = self.base_score
+        total[:, 1:] = values
+        return np.cumsum(total, axis=1, dtype=np.float32)[:, -1]
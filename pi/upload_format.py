@@ -0,0 +1,124 @@
+import gzip
+import json
+import struct
+import time
+
+import numpy as np
+
+from feature_schema import SCHEMA_VERSION, CHANNELS, STATS, FEATURE_COLUMNS
+
+"""
+NOTE:
+Binary body for the end-of-workout features upload (/api/process), instead of
+the nested {channel: {stat: [one float per rep]}} JSON. Both ends of it: the Pi
+encodes, the server decodes (backend/upload_format.py is a link to this file).
+
+Layout (little-endian):
+    prefix : b'PTFM' + u8 version + 3 pad bytes + u32 header length   (12 bytes)
+    header : utf-8 JSON {"name", "pi_id", "schema_version", "columns", "rows"
+             [, "rep_qualities"]}, space-padded so the matrix starts on a 4 byte
+             boundary (feature_schema.py: columns, and the version the server checks)
+             (rep_qualities: one per row, scored on the Pi, rep_scoring.py)
+    matrix : rows x len(columns) float32, row-major, one row per rep
+
+The server reads the matrix with np.frombuffer (a read-only view onto the
+request body, no parsing, no copy) and picks this format by Content-Type,
+falling back to the JSON body.
+float32 loses nothing the models use: XGBoost converts its input to float32.
+
+    python upload_format.py    # size / parse time against the JSON body
+"""
+
+CONTENT_TYPE = 'application/x-pitrainer-features'
+MAGIC = b'PTFM'
+VERSION = 1
+PREFIX = struct.Struct('<4sB3xI')
+
+
+def features_to_matrix(workout_features: dict) -> np.ndarray:
+    # nested upload dict -> reps x 96 float32, FEATURE_COLUMNS order
+    columns = [workout_features[channel][stat] for channel in CHANNELS for stat in STATS]
+    return np.array(columns, dtype='<f4').reshape(len(FEATURE_COLUMNS), -1).T
+
+
+def encode_features(workout_features: dict, name: str, pi_id, rep_qualities: list[float] = None) -> bytes:
+    matrix = np.ascontiguousarray(features_to_matrix(workout_features))
+    header = {
+        'name': name,
+        'pi_id': pi_id,
+        'schema_version': SCHEMA_VERSION,
+        'columns': FEATURE_COLUMNS,
+        'rows': len(matrix),
+    }
+    # only if every rep was scored, otherwise the server scores them all
+    if rep_qualities is not None and len(rep_qualities) == len(matrix):
+        header['rep_qualities'] = [float(q) for q in rep_qualities]
+    header = json.dumps(header).encode()
+    header += b' ' * (-(PREFIX.size + len(header)) % 4)
+    return PREFIX.pack(MAGIC, VERSION, len(header)) + header + matrix.tobytes()
+
+
+def decode_features(body: bytes) -> tuple[dict, np.ndarray]:
+    # header dict, rows x columns float32 view onto body, ValueError if malformed
+    if len(body) < PREFIX.size:
+        raise ValueError('truncated features body')
+    magic, version, header_len = PREFIX.unpack_from(body)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'not a version {VERSION} features body')
+
+    header = json.loads(body[PREFIX.size : PREFIX.size + header_len])
+    rows, cols = header['rows'], len(header['columns'])
+    offset = PREFIX.size + header_len
+    if len(body) - offset != rows * cols * 4:
+        raise ValueError(f'features body has {len(body) - offset} bytes of data, expected {rows}x{cols} float32')
+    matrix = np.frombuffer(body, dtype='<f4', count=rows * cols, offset=offset).reshape(rows, cols)
+    return header, matrix
+
+
+## ---- SIZE / PARSE TIME COMPARISON ---- ##
+
+def _synthetic_workout(n_reps: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {channel: {stat: rng.standard_normal(n_reps).tolist() for stat in STATS} for channel in CHANNELS}
+
+
+def _best_us(fn, repeats: int = 50) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        fn()
+        times.append(time.perf_counter_ns() - start)
+    return min(times) / 1e3
+
+
+def compare(n_reps: int) -> None:
+    features = _synthetic_workout(n_reps)
+    json_body = json.dumps({'sets_data': features, 'pi_id': 'pi', 'name': 'Seated Cable Rows'}).encode()
+    binary_body = encode_features(features, 'Seated Cable Rows', 'pi')
+
+    def parse_json():
+        # what server.process_data did before building its DataFrame
+        sets_data = json.loads(json_body)['sets_data']
+        return {f'{outer}_{inner}': list(value) for outer, subdict in sets_data.items()
+                for inner, value in subdict.items()}
+
+    def parse_binary():
+        return decode_features(binary_body)
+
+    print(f'{n_reps} reps')
+    for name, body, parse in [('json', json_body, parse_json), ('binary', binary_body, parse_binary)]:
+        print(f'    {name:<8}{len(body):>9} B  gzip {len(gzip.compress(body, 6)):>9} B'
+              f'  parse {_best_us(parse):>9.1f} us')
+
+
+if __name__ == '__main__':
+    # round trip
+    features = _synthetic_workout(7)
+    header, matrix = decode_features(encode_features(features, 'Lat Pulldowns', 'pi'))
+    assert header['name'] == 'Lat Pulldowns' and header['columns'] == FEATURE_COLUMNS
+    assert np.array_equal(matrix, features_to_matrix(features))
+    header, _ = decode_features(encode_features(features, 'Lat Pulldowns', 'pi', [70.5] * 7))
+    assert header['rep_qualities'] == [70.5] * 7
+
+    for n_reps in (12, 36, 150):
+        compare(n_reps)
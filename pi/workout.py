@@ -10,9 +10,9 @@ class Workout:
     count : int
     select : tuple[int,int]
 
-    def __init__(self, workout):
+    def __init__(self, workout, init_time=None):
         self.workout = workout
-        self.init_time = time.time()
+        self.init_time = time.time() if init_time is None else init_time
         self.rep_time = []
         self.count = 0
         self.__assign()
@@ -41,11 +41,11 @@ class Workout:
         else:
             return 1
 
-    def update(self,velocity,mag):
-        time.time()
+    def update(self,velocity,mag,now=None):
+        # now: sample timestamp, same clock as init_time (recorded data replays faster than real time)
         sel = self.select
         if (velocity[sel[0]] * self.__sign_v() > self.threshold_v[sel[0]] or mag[sel[1]] * self.__sign_m() > self.threshold_m[sel[1]] * self.__sign_m()):
-            current_time = time.time() - self.init_time
+            current_time = (time.time() if now is None else now) - self.init_time
             if (len(self.rep_time) == 0 or current_time - self.rep_time[-1] > self.timeout):
                 self.count += 1
                 self.rep_time.append(current_time)